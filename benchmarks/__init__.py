@@ -0,0 +1,7 @@
+"""
+Benchmarks for the unitpages page-serving hot path.
+
+Run with ``python -m benchmarks --help`` from the top of the source tree.
+These need the same environment as the application itself (Django,
+django-markuphelpers, docutils; django-haystack for the index case).
+"""
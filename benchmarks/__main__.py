@@ -0,0 +1,195 @@
+"""
+Benchmark runner.
+
+    python -m benchmarks [--sizes 1000,10000,100000] [--save results.json]
+                         [--baseline results.json] [--threshold 1.25]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(times, queries):
+    times = sorted(times)
+    return {
+        "iterations": len(times),
+        "mean_ms": sum(times) / len(times),
+        "p50_ms": percentile(times, 50),
+        "p90_ms": percentile(times, 90),
+        "p99_ms": percentile(times, 99),
+        "queries": sum(queries) / float(len(queries)),
+    }
+
+
+def clear_caches():
+    from unitpages.cache import (
+        clear_page_caches,
+        clear_sitefile_caches,
+        template_cache,
+    )
+    from unitpages.tree import page_tree
+
+    clear_page_caches()
+    clear_sitefile_caches()
+    template_cache.clear()
+    page_tree.clear()
+
+
+def run_case(func, state, iterations, warmup):
+    from django.db import connection
+    from django.test import override_settings
+    from django.test.utils import CaptureQueriesContext
+
+    with override_settings(UNITPAGES_CONFIG=func.unitpages_config):
+        clear_caches()
+        try:
+            op = func(state)
+            if op is None:
+                return None
+            for i in range(warmup):
+                op()
+            times = []
+            queries = []
+            for i in range(func.iterations or iterations):
+                with CaptureQueriesContext(connection) as ctx:
+                    start = time.perf_counter()
+                    op()
+                    elapsed = time.perf_counter() - start
+                times.append(elapsed * 1000.0)
+                queries.append(len(ctx.captured_queries))
+        finally:
+            if func.teardown is not None:
+                func.teardown(state)
+    return summarize(times, queries)
+
+
+def print_results(size, results, stream=sys.stdout):
+    stream.write("\n{} pages\n".format(size))
+    header = "{:<22} {:>6} {:>10} {:>10} {:>10} {:>10} {:>8}\n"
+    row = "{:<22} {:>6} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.3f} {:>8.1f}\n"
+    stream.write(
+        header.format("case", "n", "p50 ms", "p90 ms", "p99 ms", "mean ms", "queries")
+    )
+    for name, r in results.items():
+        stream.write(
+            row.format(
+                name,
+                r["iterations"],
+                r["p50_ms"],
+                r["p90_ms"],
+                r["p99_ms"],
+                r["mean_ms"],
+                r["queries"],
+            )
+        )
+
+
+def compare(results, baseline, threshold, stream=sys.stdout):
+    """
+    Report cases slower (p50) than threshold * baseline, or doing more
+    queries than the baseline.  Returns the number of regressions.
+    """
+    regressions = 0
+    stream.write("\nComparison with baseline (threshold x{})\n".format(threshold))
+    for size, cases in results["results"].items():
+        base_cases = baseline.get("results", {}).get(size, {})
+        for name, r in cases.items():
+            b = base_cases.get(name)
+            if b is None:
+                continue
+            ratio = r["p50_ms"] / b["p50_ms"] if b["p50_ms"] else 1.0
+            flags = []
+            if ratio > threshold:
+                flags.append("SLOWER")
+            if r["queries"] > b["queries"]:
+                flags.append("MORE QUERIES")
+            regressions += bool(flags)
+            stream.write(
+                "{:>7} {:<22} p50 x{:.2f} queries {:.1f} -> {:.1f} {}\n".format(
+                    size, name, ratio, b["queries"], r["queries"], " ".join(flags)
+                )
+            )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument(
+        "--sizes", default="1000", help="Comma separated page tree sizes"
+    )
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--cases", help="Comma separated case names (default: all)")
+    parser.add_argument("--save", help="Write the results (JSON) to this file")
+    parser.add_argument("--baseline", help="Compare against saved results")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="unitpages-bench-")
+    os.environ.setdefault("UNITPAGES_BENCHMARK_DB", os.path.join(workdir, "db.sqlite3"))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    import django
+
+    django.setup()
+
+    from django.core.management import call_command
+
+    from .cases import CASES, State
+    from .data import build_pages
+
+    call_command("migrate", verbosity=0)
+
+    selected = CASES
+    if args.cases:
+        names = set(args.cases.split(","))
+        selected = [c for c in CASES if c.__name__ in names]
+
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": {},
+    }
+    for size in [int(s) for s in args.sizes.split(",")]:
+        urls = build_pages(size, seed=args.seed)
+        state = State(urls, seed=args.seed)
+        size_results = results["results"][str(size)] = {}
+        for func in selected:
+            r = run_case(func, state, args.iterations, args.warmup)
+            if r is not None:
+                size_results[func.__name__] = r
+        print_results(size, size_results)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+"""
+The benchmarked operations.
+
+Each case is a function taking the benchmark state and returning
+the operation to time (a callable taking no arguments).  Cases may
+carry ``unitpages_config`` (UNITPAGES_CONFIG overrides used while the
+case runs), ``iterations`` (a default iteration count) and
+``teardown`` (a function taking the state, run after the case, that
+undoes its changes to the pages).
+"""
+import random
+
+from django.contrib.auth.models import AnonymousUser
+from django.template import Context, Template
+from django.test import RequestFactory
+
+CASES = []
+
+
+def case(iterations=None, **unitpages_config):
+    def decorator(func):
+        func.unitpages_config = unitpages_config
+        func.iterations = iterations
+        func.teardown = None
+        CASES.append(func)
+        return func
+
+    return decorator
+
+
+class State(object):
+    """
+    Things shared by the cases for one page tree.
+    """
+
+    def __init__(self, urls, seed=0, sample_size=200):
+        self.urls = urls
+        self.rng = random.Random(seed)
+        self.sample = self.rng.sample(urls, min(sample_size, len(urls)))
+        self.deep_sample = sorted(urls, key=lambda u: -u.count("/"))[:sample_size]
+        self.factory = RequestFactory()
+
+    def cycle(self, items):
+        """
+        Return a function giving the items in turn, forever.
+        """
+        state = {"i": 0}
+
+        def next_item():
+            item = items[state["i"] % len(items)]
+            state["i"] += 1
+            return item
+
+        return next_item
+
+
+#######################################################################
+
+
+@case(page_cache=False)
+def get_page_uncached(state):
+    from unitpages.views import get_page
+
+    next_url = state.cycle(state.sample)
+    return lambda: get_page(next_url())
+
+
+@case(page_cache=True)
+def get_page_cached(state):
+    from unitpages.views import get_page
+
+    next_url = state.cycle(state.sample)
+    for url in state.sample:
+        get_page(url)
+    return lambda: get_page(next_url())
+
+
+def _breadcrumbs(state):
+    from unitpages.models import Page
+
+    pages = list(Page.objects.filter(url__in=state.deep_sample).only("url"))
+    next_page = state.cycle(pages)
+    return lambda: next_page().breadcrumbs()
+
+
+@case(page_tree=False)
+def breadcrumbs_query(state):
+    return _breadcrumbs(state)
+
+
+@case(page_tree=True)
+def breadcrumbs_tree(state):
+    return _breadcrumbs(state)
+
+
+def _unitpage(state):
+    from unitpages.views import unitpage
+
+    next_url = state.cycle(state.sample)
+
+    def op():
+        url = next_url()
+        request = state.factory.get(url)
+        request.user = AnonymousUser()
+        response = unitpage(request, url)
+        assert response.status_code == 200, response.status_code
+        return response
+
+    return op
+
+
+@case(iterations=100)
+def unitpage_live(state):
+    """
+    prerender + ReStructuredText on every request.
+    """
+    from unitpages.models import Page
+
+    Page.objects.filter(url__in=state.sample).update(live_render=True)
+    return _unitpage(state)
+
+
+def _unitpage_live_teardown(state):
+    from unitpages.models import Page
+
+    Page.objects.filter(url__in=state.sample).update(live_render=False)
+
+
+unitpage_live.teardown = _unitpage_live_teardown
+
+
+@case(iterations=100)
+def unitpage_stored(state):
+    """
+    pre-rendered (render on save) content.
+    """
+    from unitpages.models import Page
+    from unitpages.rendering import render_page
+
+    for page in Page.objects.filter(url__in=state.sample):
+        render_page(page)
+        Page.objects.filter(pk=page.pk).update(
+            rendered_content=page.rendered_content,
+            rendered_hash=page.rendered_hash,
+            rendered_version=page.rendered_version,
+        )
+    return _unitpage(state)
+
+
+@case()
+def unitpage_url_tags(state):
+    """
+    A navigation-heavy template with 60 unitpage_url tags.
+    """
+    from .data import href_template
+
+    template = Template(href_template(state.urls))
+    return lambda: template.render(Context({}))
+
+
+@case(iterations=5)
+def sitemap(state):
+    from unitpages.sitemap import Page_Sitemap
+    from unitpages.sitemap import sitemap as sitemap_view
+
+    sitemaps = {"pages": Page_Sitemap}
+
+    def op():
+        request = state.factory.get("/sitemap.xml")
+        response = sitemap_view(request, sitemaps)
+        for chunk in response.streaming_content:
+            pass
+
+    return op
+
+
+@case(iterations=100)
+def page_index_prepare(state):
+    try:
+        from unitpages.search_indexes import PageIndex
+    except ImportError:
+        return None
+    from unitpages.models import Page
+
+    index = PageIndex()
+    pages = list(Page.objects.filter(url__in=state.sample))
+    next_page = state.cycle(pages)
+    return lambda: index.full_prepare(next_page())
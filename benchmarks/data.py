@@ -0,0 +1,104 @@
+"""
+Synthetic page trees for the benchmarks.
+"""
+import random
+
+CONTENT_TEMPLATE = """\
+Section {n}
+==========={underline}
+
+This is page number {n}.  It links to its parent
+({{% unitpage_url "{parent}" %}}) and to a sibling
+({{% unitpage_url "{sibling}" %}}), and has some *emphasis*, **strong**
+text and ``literals``.
+
+* one item
+* another item with a `link <http://example.com/{n}/>`_
+
+1. first
+2. second
+
+.. note::
+
+   A note, so docutils has some directives to process.
+
+{paragraphs}
+"""
+
+PARAGRAPH = (
+    "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod "
+    "tempor incididunt ut labore et dolore magna aliqua.  Ut enim ad minim "
+    "veniam, quis nostrud exercitation ullamco laboris nisi ut aliquip.\n\n"
+)
+
+
+def page_urls(count, branching=10):
+    """
+    Return count page urls forming a tree (breadth first, root first).
+    """
+    urls = ["/"]
+    queue = ["/"]
+    while len(urls) < count:
+        parent = queue.pop(0)
+        for i in range(branching):
+            if len(urls) >= count:
+                break
+            url = "{}p{}/".format(parent, len(urls))
+            urls.append(url)
+            queue.append(url)
+    return urls
+
+
+def parent_url(url):
+    if url == "/":
+        return "/"
+    return url.rstrip("/").rsplit("/", 1)[0] + "/"
+
+
+def build_pages(count, seed=0, batch_size=2000):
+    """
+    Replace every page with a synthetic tree of count pages.
+    Returns the list of page urls.
+    """
+    from unitpages.models import Page
+
+    rng = random.Random(seed)
+    urls = page_urls(count)
+    Page.objects.all().delete()
+    batch = []
+    for n, url in enumerate(urls):
+        content = CONTENT_TEMPLATE.format(
+            n=n,
+            underline="=" * len(str(n)),
+            parent=parent_url(url),
+            sibling=rng.choice(urls),
+            paragraphs=PARAGRAPH * rng.randint(2, 8),
+        )
+        batch.append(
+            Page(
+                url=url,
+                url_reversed=url[::-1],
+                title="Page {}".format(n),
+                short_title="P{}".format(n),
+                content=content,
+                public=(n % 20 != 0),
+            )
+        )
+        if len(batch) >= batch_size:
+            Page.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Page.objects.bulk_create(batch)
+    return urls
+
+
+def href_template(urls, count=60, seed=0):
+    """
+    Template text with count unitpage_url tags (navigation-heavy page).
+    """
+    rng = random.Random(seed)
+    lines = ["{% load unitpages_tags %}<ul>"]
+    for url in rng.sample(urls, min(count, len(urls))):
+        lines.append('<li><a href="{% unitpage_url "' + url + '" %}">x</a></li>')
+    lines.append("</ul>")
+    return "\n".join(lines)
@@ -0,0 +1,3 @@
+from django.conf.urls import include, url
+
+urlpatterns = [url(r"^", include("unitpages.urls"))]
@@ -5,11 +5,14 @@ Admin interface for unitpages.
 
 from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
 from django.contrib.auth import get_permission_codename
+from django.db import models
 from django.utils.html import format_html
 from django.utils.translation import ugettext_lazy as _
 
-from .forms import AdminPageForm
+from . import conf, search
+from .forms import AdminPageForm, AssetFormSet, FileUrlInput
 from .models import Asset, Page, SiteFile
 
 #######################################################################
@@ -48,15 +51,51 @@ if use_guardian:
         def has_change_permission_for_all(self, request):
             return super(RestrictedModelAdmin, self).has_change_permission(request)
 
+        def _get_request_memo(self, request):
+            """
+            Permission checks are remembered for the rest of the request.
+            """
+            memo = getattr(request, "_restricted_admin_memo", None)
+            if memo is None or memo[0] is not request.user:
+                memo = (request.user, {})
+                request._restricted_admin_memo = memo
+            return memo[1].setdefault(self.opts.label, {})
+
+        def _get_permitted_objects(self, request):
+            """
+            The user's guardian objects (a queryset).
+            """
+            memo = self._get_request_memo(request)
+            if "objects" not in memo:
+                permname = self._get_permname("change")
+                memo["objects"] = get_objects_for_user(request.user, permname)
+            return memo["objects"]
+
+        def _get_permitted_pks(self, request):
+            memo = self._get_request_memo(request)
+            if "pks" not in memo:
+                memo["pks"] = set(
+                    self._get_permitted_objects(request).values_list("pk", flat=True)
+                )
+            return memo["pks"]
+
+        def _has_permitted_objects(self, request):
+            memo = self._get_request_memo(request)
+            if "exists" not in memo:
+                if "pks" in memo:
+                    memo["exists"] = bool(memo["pks"])
+                else:
+                    memo["exists"] = self._get_permitted_objects(request).exists()
+            return memo["exists"]
+
         def _is_restricted_admin(self, request):
-            permname = self._get_permname("change")
-            change_all = self.has_change_permission_for_all(request)
-            if change_all:
-                return False
-            change_some = get_objects_for_user(request.user, permname).exists()
-            if change_some:
-                return True
-            return False
+            memo = self._get_request_memo(request)
+            if "restricted" not in memo:
+                change_all = self.has_change_permission_for_all(request)
+                memo["restricted"] = (not change_all) and self._has_permitted_objects(
+                    request
+                )
+            return memo["restricted"]
 
         def _get_permname(self, permtype):
             """
@@ -76,17 +115,15 @@ if use_guardian:
             if request.user.is_superuser:
                 return qs
             if self._is_restricted_admin(request):
-                permname = self._get_permname("change")
                 # TODO: maybe filter original queryset based on this one?
-                qs = get_objects_for_user(request.user, permname)
+                qs = self._get_permitted_objects(request).all()
             return qs
 
         def has_change_permission(self, request, obj=None):
             if (obj is None) and self._is_restricted_admin(request):
                 return True
-            permname = self._get_permname("change")
             if self._is_restricted_admin(request):
-                flag = request.user.has_perm(permname, obj)
+                flag = obj.pk in self._get_permitted_pks(request)
             else:
                 flag = self.has_change_permission_for_all(request)
             return flag
@@ -97,10 +134,7 @@ if use_guardian:
                 return True
             if not request.user.is_staff:
                 return False
-            permname = self._get_permname("change")
-            if get_objects_for_user(request.user, permname).exists():
-                return True
-            return False
+            return self._has_permitted_objects(request)
 
         def get_readonly_fields(self, request, obj=None):
             result = super(RestrictedModelAdmin, self).get_readonly_fields(request, obj)
@@ -133,6 +167,8 @@ admin.site.register(SiteFile, SiteFileAdmin)
 
 class AssetInline(admin.TabularInline):
     model = Asset
+    formset = AssetFormSet
+    formfield_overrides = {models.FileField: {"widget": FileUrlInput}}
     fields = ["file", "description", ("current_url", "changelist_buttons")]
     readonly_fields = ["current_url", "changelist_buttons"]
     extra = 0
@@ -168,6 +204,16 @@ class AssetInline(admin.TabularInline):
 ###############################################################
 
 
+class PageChangeList(ChangeList):
+    """
+    The changelist never shows page content, so it is not loaded.
+    """
+
+    def get_queryset(self, request):
+        qs = super(PageChangeList, self).get_queryset(request)
+        return qs.defer("content", "rendered_content")
+
+
 class PageAdmin(MyModelAdmin):
     inlines = [AssetInline]
     list_display = ["url", "title", "active", "public"]
@@ -176,9 +222,38 @@ class PageAdmin(MyModelAdmin):
     ordering = ["url", "title"]
     form = AdminPageForm
     restricted_readonly_fields = ["url"]
+    # the most matches an "index" content search adds to the changelist
+    search_index_limit = 500
     # required to override django-guardian template override:
     change_form_template = "admin/unitpages/page/change_form.html"
 
+    def get_changelist(self, request, **kwargs):
+        return PageChangeList
+
+    def get_search_fields(self, request):
+        if conf.get("admin_content_search") == "icontains":
+            return self.search_fields
+        return [f for f in self.search_fields if f != "content"]
+
+    def get_search_results(self, request, queryset, search_term):
+        qs, use_distinct = super(PageAdmin, self).get_search_results(
+            request, queryset, search_term
+        )
+        if search_term and conf.get("admin_content_search") == "fulltext":
+            from django.contrib.postgres.search import SearchQuery, SearchVector
+
+            config = conf.get("search_config")
+            matches = queryset.annotate(
+                content_search=SearchVector("content", config=config)
+            ).filter(content_search=SearchQuery(search_term, config=config))
+            qs = qs | queryset.filter(pk__in=matches.values("pk"))
+        if search_term and conf.get("admin_content_search") == "index":
+            results = search.search(
+                search_term, public=False, limit=self.search_index_limit
+            )
+            qs = qs | queryset.filter(pk__in=[pk for pk, score in results])
+        return qs, use_distinct
+
 
 admin.site.register(Page, PageAdmin)
 
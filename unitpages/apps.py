@@ -15,6 +15,65 @@ class PagesConfig(AppConfig):
         Any app specific startup code, e.g., register signals,
         should go here.
         """
+        from django.db.models.signals import post_delete, post_save
+
+        from . import signals
+
+        Asset = self.get_model("Asset")
+        Page = self.get_model("Page")
+        SiteFile = self.get_model("SiteFile")
+        post_save.connect(
+            signals.page_changed, sender=Page, dispatch_uid="unitpages-page-saved"
+        )
+        post_delete.connect(
+            signals.page_changed, sender=Page, dispatch_uid="unitpages-page-deleted"
+        )
+        post_save.connect(
+            signals.page_saved, sender=Page, dispatch_uid="unitpages-page-tree-saved"
+        )
+        post_delete.connect(
+            signals.page_deleted,
+            sender=Page,
+            dispatch_uid="unitpages-page-tree-deleted",
+        )
+        post_save.connect(
+            signals.page_dependents_changed,
+            sender=Page,
+            dispatch_uid="unitpages-page-dependents-saved",
+        )
+        post_delete.connect(
+            signals.page_dependents_changed,
+            sender=Page,
+            dispatch_uid="unitpages-page-dependents-deleted",
+        )
+        post_save.connect(
+            signals.page_search_saved,
+            sender=Page,
+            dispatch_uid="unitpages-page-search-saved",
+        )
+        post_delete.connect(
+            signals.page_search_deleted,
+            sender=Page,
+            dispatch_uid="unitpages-page-search-deleted",
+        )
+        post_save.connect(
+            signals.asset_changed, sender=Asset, dispatch_uid="unitpages-asset-saved"
+        )
+        post_delete.connect(
+            signals.asset_changed,
+            sender=Asset,
+            dispatch_uid="unitpages-asset-deleted",
+        )
+        post_save.connect(
+            signals.sitefile_changed,
+            sender=SiteFile,
+            dispatch_uid="unitpages-sitefile-saved",
+        )
+        post_delete.connect(
+            signals.sitefile_changed,
+            sender=SiteFile,
+            dispatch_uid="unitpages-sitefile-deleted",
+        )
 
 
 #########################################################################
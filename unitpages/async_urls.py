@@ -0,0 +1,32 @@
+"""
+UnitPage url patterns, with the async page and sitefile views.
+
+Use this in place of ``unitpages.urls`` when serving with ASGI
+(Django 3.1 or later); the same notes about including it apply.
+
+E.g.,
+
+    url(r'^', include('unitpages.async_urls')),   # must be last!
+
+"""
+
+from django.conf.urls import url
+
+from .async_views import sitefile, unitpage
+from .router import page_url
+from .views import page_search, page_update
+
+urlpatterns = [
+    # root index page
+    url(r"^$", unitpage, kwargs={"url": "/"}, name="unitpages-root"),
+    # page editor
+    url(r"^_update(?P<url>.*)$", page_update, name="unitpages-update"),
+    # built-in page search
+    url(r"^_search/$", page_search, name="unitpages-search"),
+    # sitefile redirects
+    url(r"^_files/(?P<slug>[\w-]+)/$", sitefile, name="unitpages-sitefile"),
+    url(r"^_files/(?P<slug>[\w-]+)$", sitefile, name="unitpages-sitefile-noslash"),
+    # catch everything else... but only if it ends with /
+    # (and, with the 'page_router' setting, is an active page url)
+    page_url(r"^(?P<url>.*/)$", unitpage, name="unitpages-link"),
+]
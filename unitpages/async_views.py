@@ -0,0 +1,106 @@
+"""
+Async versions of the page and sitefile views, for ASGI servers.
+
+These need Django 3.1 or later.  The ORM, the template engine and
+docutils are all synchronous, so the views hand their work to a
+bounded pool of threads (the 'async_threads' setting).  Django would
+otherwise run sync views one at a time in a single thread.  Sitefile
+redirects that are already in the sitefile url cache are answered
+without leaving the event loop.
+
+Use ``unitpages.async_urls`` in place of ``unitpages.urls``.
+"""
+#######################################################################
+from __future__ import print_function, unicode_literals
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections
+from django.http import Http404, HttpResponseRedirect
+
+from . import conf, views
+from .cache import SITEFILE_NOT_FOUND, check_generation, sitefile_url_cache
+
+if django.VERSION < (3, 1):
+    raise ImproperlyConfigured("unitpages.async_views requires Django 3.1 or later")
+
+#######################################################################
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    The (per-process) thread pool for synchronous work.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=conf.get("async_threads"),
+                    thread_name_prefix="unitpages",
+                )
+    return _executor
+
+
+def _call(func, args, kwargs):
+    # pool threads keep their own database connections;
+    # apply CONN_MAX_AGE (and drop broken connections) as requests do.
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_in_pool(func, *args, **kwargs):
+    """
+    Call func(*args, **kwargs) in the thread pool, and return the result.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_executor(), functools.partial(_call, func, args, kwargs)
+    )
+
+
+#######################################################################
+
+
+async def unitpage(request, url, extra_data=None, template_name=None):
+    """
+    Find the page, serve it; see views.unitpage().
+    """
+    return await run_in_pool(
+        views.unitpage,
+        request,
+        url,
+        extra_data=extra_data,
+        template_name=template_name,
+    )
+
+
+_sitefile_view = views.SiteFileDetailView.as_view()
+
+
+async def sitefile(request, slug):
+    """
+    Redirect to (or serve) a sitefile; see views.SiteFileDetailView.
+    """
+    if conf.get("sitefile_url_cache") and not conf.get("sitefile_serve"):
+        check_generation()
+        url = sitefile_url_cache.get(slug)
+        if url is SITEFILE_NOT_FOUND:
+            raise Http404("No SiteFile matches the given query.")
+        if url is not None:
+            return HttpResponseRedirect(url)
+    return await run_in_pool(_sitefile_view, request, slug=slug)
+
+
+#######################################################################
@@ -0,0 +1,260 @@
+"""
+Per-process caches for unitpages.
+
+These are plain in-memory structures, local to each worker process.
+They are cleared by the model signal handlers in ``unitpages.signals``.
+Other worker processes learn of the change through a generation
+counter kept in a shared Django cache (the 'invalidation_cache'
+setting), which they check before using their own copies; the pages
+changed are kept with it, so page trees are updated, not rebuilt.  An
+optional timeout also bounds how stale another worker's copy can get.
+"""
+#######################################################################
+from __future__ import print_function, unicode_literals
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.db import transaction
+
+from . import conf
+
+#######################################################################
+
+
+class LRUCache(object):
+    """
+    A small, thread-safe, bounded mapping with least-recently-used
+    eviction and an optional per-entry timeout (in seconds).
+    The size and timeout may be given as the names of settings, which
+    are read when used (see conf.setting_value()).
+    """
+
+    def __init__(self, maxsize=1024, timeout=None):
+        self._maxsize = maxsize
+        self._timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def maxsize(self):
+        return conf.setting_value(self._maxsize)
+
+    @property
+    def timeout(self):
+        return conf.setting_value(self._timeout)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires is not None and expires < time.time():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        expires = None
+        timeout = self.timeout
+        if timeout:
+            expires = time.time() + timeout
+        maxsize = self.maxsize
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """
+        Return a dictionary of the cache counters.
+        """
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+#######################################################################
+
+# Sentinel results for the page resolution and sitefile url caches.
+PAGE_NOT_FOUND = object()
+PAGE_APPEND_SLASH = object()
+SITEFILE_NOT_FOUND = object()
+
+
+page_resolution_cache = LRUCache(
+    maxsize="page_cache_size", timeout="page_cache_timeout"
+)
+
+
+# SiteFile slug -> resolved file url.
+sitefile_url_cache = LRUCache(maxsize="page_cache_size", timeout="page_cache_timeout")
+
+# Compiled ``prerender`` templates, keyed by a hash of the page text.
+# Content changes produce a new key, so this never needs invalidating.
+template_cache = LRUCache(maxsize="template_cache_size")
+
+# Candidate template names -> (fingerprint, name of the template found);
+# see views.select_template_name().
+template_name_cache = LRUCache(maxsize="page_cache_size")
+
+
+GENERATION_KEY = "unitpages:generation"
+
+# Each generation also has an entry listing the pages changed, so the
+# other processes can update their page trees instead of rebuilding
+# them.  Processes further behind than this rebuild their trees.
+CHANGES_TIMEOUT = 3600
+CHANGES_MAX = 100
+
+_generation = {"seen": None, "checked": 0.0, "own": set()}
+_generation_lock = threading.Lock()
+
+
+def _get_invalidation_cache():
+    alias = conf.get("invalidation_cache")
+    if alias is None:
+        return None
+    return caches[alias]
+
+
+def _clear_local_caches():
+    from .tree import page_tree
+
+    page_resolution_cache.clear()
+    sitefile_url_cache.clear()
+    page_tree.clear()
+
+
+def _changes_key(generation):
+    return "{}:{}".format(GENERATION_KEY, generation)
+
+
+def _apply_changes(cache, seen, generation):
+    """
+    Catch up with the changes other processes made between the two
+    generations.
+    """
+    from .tree import page_tree
+
+    numbers = [
+        n for n in range(seen + 1, generation + 1) if n not in _generation["own"]
+    ]
+    _generation["own"] = {n for n in _generation["own"] if n > generation}
+    if not numbers:
+        return
+    page_resolution_cache.clear()
+    sitefile_url_cache.clear()
+    changes = {}
+    if len(numbers) <= CHANGES_MAX:
+        changes = cache.get_many([_changes_key(n) for n in numbers])
+    if len(changes) < len(numbers) or None in changes.values():
+        page_tree.clear()
+    else:
+        page_tree.refresh(set().union(*changes.values()))
+
+
+def check_generation():
+    """
+    Catch up with the page and sitefile changes made by other processes
+    since this one's caches were filled: the page and sitefile caches
+    are dropped, and the page tree updated (or, if the changes are
+    unknown, rebuilt).
+    """
+    cache = _get_invalidation_cache()
+    if cache is None:
+        return
+    now = time.time()
+    interval = conf.get("invalidation_interval")
+    if interval and now - _generation["checked"] < interval:
+        return
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, 0, None)
+        generation = 0
+    with _generation_lock:
+        _generation["checked"] = now
+        seen = _generation["seen"]
+        if generation != seen:
+            if seen is not None and generation > seen:
+                _apply_changes(cache, seen, generation)
+            elif seen is not None:
+                # the shared cache was reset; the changes are unknown.
+                _clear_local_caches()
+            _generation["seen"] = generation
+
+
+def _bump_generation(changed_pks):
+    cache = _get_invalidation_cache()
+    if cache is None:
+        return
+    try:
+        generation = cache.incr(GENERATION_KEY)
+    except ValueError:
+        if cache.add(GENERATION_KEY, 1, None):
+            generation = 1
+        else:
+            generation = cache.incr(GENERATION_KEY)
+    if changed_pks is not None:
+        changed_pks = list(changed_pks)
+    cache.set(_changes_key(generation), changed_pks, CHANGES_TIMEOUT)
+    with _generation_lock:
+        # this process's caches are already up to date.
+        _generation["own"].add(generation)
+
+
+def bump_generation(changed_pks=None):
+    """
+    Tell the other processes to drop their caches (once the current
+    transaction, if any, is committed).  changed_pks are the pages whose
+    page tree entries may have changed; None if they are not known.
+    """
+    transaction.on_commit(lambda: _bump_generation(changed_pks))
+
+
+def clear_page_caches(changed_pks=None):
+    """
+    Drop every cached page resolution, in every process; see
+    bump_generation() for changed_pks.  (This process's page tree is
+    kept up to date by the signal handlers.)
+    """
+    page_resolution_cache.clear()
+    bump_generation(changed_pks)
+
+
+def clear_sitefile_caches():
+    """
+    Drop every cached sitefile url, in every process.
+    """
+    sitefile_url_cache.clear()
+    bump_generation(())
+
+
+#######################################################################
@@ -6,8 +6,12 @@ is not present in your settings.
 CONFIG_NAME = "UNITPAGES_CONFIG"  # must be uppercase!
 
 
+from types import MappingProxyType
+
 from django.conf import settings
 from django.core.files.storage import default_storage
+from django.core.signals import setting_changed
+from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
 
 DEFAULT = {
@@ -23,9 +27,193 @@ DEFAULT = {
         + '<a href="http://docutils.sourceforge.net/docs/user/rst/quickstart.html"'
         + ' target="_blank">ReStructuredText</a>'
     ),
+    # 'page_cache' enables the per-process url -> page resolution cache
+    # used by views.get_page().
+    # (optional)
+    "page_cache": True,
+    # 'page_cache_size' is the maximum number of cached url resolutions
+    # (including misses) kept by each process.
+    # (optional)
+    "page_cache_size": 2048,
+    # 'page_cache_timeout' is the number of seconds a cached resolution
+    # may be used for; this bounds staleness in *other* worker processes
+    # when there is no shared 'invalidation_cache'.
+    # None means no timeout.
+    # (optional)
+    "page_cache_timeout": 60,
+    # 'invalidation_cache' is the name of a cache (in settings.CACHES),
+    # shared by all worker processes, that holds a counter bumped whenever
+    # pages or sitefiles change; each process checks it before using its
+    # own page/sitefile caches and page tree.  It must be shared (e.g.,
+    # memcached or redis, not the local memory cache) to have any effect
+    # across processes.  None disables the check.
+    # (optional)
+    "invalidation_cache": "default",
+    # 'invalidation_interval' is the minimum number of seconds between
+    # checks of the 'invalidation_cache' counter (0 checks on every
+    # lookup).
+    # (optional)
+    "invalidation_interval": 0,
+    # 'template_cache_size' is the maximum number of compiled page content
+    # templates (for the prerender filter/tag) kept by each process.
+    # (optional)
+    "template_cache_size": 512,
+    # 'template_name_cache' remembers which of the candidate templates
+    # is used for each page url (in each process), so the template loaders
+    # only look for one name.  With DEBUG on, the cache is checked
+    # against the template directories' modification times.
+    # (optional)
+    "template_name_cache": True,
+    # 'render_on_save' stores pre-rendered html for page content when
+    # a page is saved; see also the unitpages_render management command.
+    # (optional)
+    "render_on_save": True,
+    # 'content_renderer' converts ReStructuredText for page content: a
+    # renderer class (or dotted path to one), created with the
+    # 'content_renderer_options' as keyword arguments, or an instance.
+    # Use "unitpages.rendering.ProcessPoolRenderer" to convert in a pool
+    # of worker processes; its options are max_workers (default: the
+    # number of cpus), timeout (seconds, default 10) and max_size
+    # (characters, default 1000000); text that is too long or too slow
+    # is converted inline when html is stored, and page views show the
+    # last stored html instead.
+    # (optional)
+    "content_renderer": "unitpages.rendering.InlineRenderer",
+    # (optional)
+    "content_renderer_options": {},
+    # 'page_tree' serves breadcrumbs and page title lookups from an
+    # in-memory tree of the active pages (see unitpages.tree), instead
+    # of querying the database each time.  The tree also honours
+    # 'page_cache_timeout'.
+    # (optional)
+    "page_tree": True,
+    # 'page_router' makes the catch-all page url pattern match only the
+    # urls of active pages (from the page tree), so requests for unknown
+    # paths get a 404 without any database query; see unitpages.router.
+    # (optional)
+    "page_router": False,
+    # 'sitemap_limit' is the maximum number of urls in one page of the
+    # page sitemap; larger sites are split into sitemap index sections.
+    # (optional)
+    "sitemap_limit": 50000,
+    # 'sitemap_chunk_size' is the number of pages fetched from the
+    # database at a time by the streaming sitemap view.
+    # (optional)
+    "sitemap_chunk_size": 2000,
+    # 'conditional_get' adds ETag/Last-Modified validators (from the
+    # modification times of the page, its assets, its breadcrumb pages,
+    # and the pages and sitefiles its content references) to anonymous
+    # page responses, and answers matching conditional requests with
+    # 304 Not Modified before any rendering is done.  Pages rendered live
+    # for each request get no validators.
+    # (optional)
+    "conditional_get": True,
+    # 'response_cache' is the name of a cache (in settings.CACHES) used to
+    # store complete responses for anonymous page views; entries are
+    # purged when the pages and assets they show are changed.
+    # None disables the response cache.
+    # (optional)
+    "response_cache": None,
+    # 'response_cache_timeout' is the lifetime of cached page responses,
+    # in seconds.
+    # (optional)
+    "response_cache_timeout": 3600,
+    # 'sitefile_url_cache' remembers the resolved url of each sitefile
+    # (in each process; cleared when sitefiles are saved or deleted),
+    # so the sitefile redirect needs no database or storage access.
+    # It uses the page cache size and timeout.
+    # (optional)
+    "sitefile_url_cache": True,
+    # 'sitefile_serve' makes the sitefile view serve the file itself,
+    # (with range and conditional request support) rather than
+    # redirecting to the storage url.
+    # (optional)
+    "sitefile_serve": False,
+    # 'storage_base_url' is the url that file names in 'storage' are
+    # appended to, when the storage's own urls are expensive to compute
+    # (e.g., a remote storage) and not signed.  None uses the base_url of
+    # a FileSystemStorage (or a subclass that keeps its url() method),
+    # and otherwise asks the storage for each url.
+    # (optional)
+    "storage_base_url": None,
+    # 'async_threads' is the number of threads used by the async views
+    # (see unitpages.async_views) for database, template and docutils work.
+    # (optional)
+    "async_threads": 8,
+    # 'instrumentation' records per-stage timings and query counts for
+    # page requests; see unitpages.instrumentation.
+    # (optional)
+    "instrumentation": False,
+    # 'instrumentation_header' adds a Server-Timing header to instrumented
+    # responses.
+    # (optional)
+    "instrumentation_header": True,
+    # 'instrumentation_sinks' is a list of callables (or dotted paths to
+    # them) called as sink(request, recorder) after each instrumented
+    # request.
+    # (optional)
+    "instrumentation_sinks": ["unitpages.instrumentation.logging_sink"],
+    # 'admin_content_search' is how the page admin searches page content:
+    #   "icontains" - a (non-indexed) substring match, as Django does;
+    #   "index" - the built-in search index (see 'search', below);
+    #   "fulltext" - PostgreSQL full text search (django.contrib.postgres),
+    #       which can use an index such as
+    #       CREATE INDEX unitpages_page_content_fts ON unitpages_page
+    #           USING gin (to_tsvector('english', COALESCE(content, '')));
+    #   None - do not search page content.
+    # (optional)
+    "admin_content_search": "icontains",
+    # 'search' keeps the built-in page search index (unitpages.search)
+    # up to date as pages are saved and deleted.
+    # (optional)
+    "search": True,
+    # 'search_backend' is the built-in search backend: "token" (any
+    # database), "sqlite" (FTS5), "postgresql" (tsvector), or "auto" to
+    # use the database specific backend when it is available.
+    # Run the unitpages_search_index command after changing this.
+    # (optional)
+    "search_backend": "auto",
+    # 'search_config' is the PostgreSQL text search configuration used by
+    # the "postgresql" search backend and the "fulltext" admin search.
+    # (optional)
+    "search_config": "english",
+    # 'search_limit' is the maximum number of results shown by the
+    # public search view.
+    # (optional)
+    "search_limit": 50,
 }
 
 
+_resolved = None
+
+
+def _resolve():
+    """
+    Return the resolved (read-only) settings, computing them once.
+    """
+    global _resolved
+    resolved = _resolved
+    if resolved is None:
+        app_settings = getattr(settings, CONFIG_NAME, DEFAULT)
+        resolved = _resolved = MappingProxyType(
+            {
+                setting: app_settings.get(setting, DEFAULT[setting])
+                for setting in DEFAULT
+            }
+        )
+    return resolved
+
+
+@receiver(setting_changed)
+def _reset(setting, **kwargs):
+    """
+    Forget the resolved settings when they are changed (e.g., by tests).
+    """
+    global _resolved
+    if setting == CONFIG_NAME:
+        _resolved = None
+
+
 def get(setting):
     """
     get(setting) -> value
@@ -34,15 +222,22 @@ def get(setting):
     retrieve.
     """
     assert setting in DEFAULT, "the setting %r has no default value" % setting
-    app_settings = getattr(settings, CONFIG_NAME, DEFAULT)
-    return app_settings.get(setting, DEFAULT[setting])
+    return _resolve()[setting]
+
+
+def setting_value(value):
+    """
+    Return value, or, if it is a string, the current value of the
+    setting with that name.  (Lets long-lived objects take sizes and
+    timeouts that follow the settings.)
+    """
+    if isinstance(value, str):
+        return get(value)
+    return value
 
 
 def get_all():
     """
-    Return all current settings as a dictionary.
+    Return all current settings as a (read-only) dictionary.
     """
-    app_settings = getattr(settings, CONFIG_NAME, DEFAULT)
-    return dict(
-        [(setting, app_settings.get(setting, DEFAULT[setting])) for setting in DEFAULT]
-    )
+    return _resolve()
@@ -0,0 +1,170 @@
+"""
+Content dependencies between pages.
+
+While page content is pre-rendered (see ``unitpages.rendering``), the
+page template tags record the page urls and sitefile slugs they
+look up.  The references are stored as PageDependency rows when the
+rendered html is stored.  When a page or sitefile changes, only the
+pages that referenced it have their stored html marked stale (and
+their cached responses purged).  Views render stale pages live;
+``unitpages_render`` (which only renders stale pages) stores their
+html again, in batches, and should be run periodically, e.g., from
+cron::
+
+    */5 * * * *  ./manage.py unitpages_render --verbosity 0
+
+``unitpage_url`` also matches pages whose url *ends* with the given
+url, so a page change invalidates references to any of its url's
+suffixes.  References are recorded as pages are rendered; run
+``unitpages_render --force`` once to record them for existing pages.
+"""
+#######################################################################
+from __future__ import print_function, unicode_literals
+
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import response_cache
+from .cache import clear_page_caches
+from .tree import url_parts
+
+#######################################################################
+
+PAGE = "page"
+SITEFILE = "sitefile"
+
+_local = threading.local()
+
+#######################################################################
+
+
+class Recorder(object):
+    """
+    The references made while rendering some content.
+    """
+
+    def __init__(self):
+        self.references = set()
+
+    def add(self, kind, target):
+        self.references.add((kind, target))
+
+
+@contextmanager
+def recording():
+    """
+    Record the references made (in this thread) within the block.
+    """
+    previous = getattr(_local, "recorder", None)
+    recorder = _local.recorder = Recorder()
+    try:
+        yield recorder
+    finally:
+        _local.recorder = previous
+
+
+def record(kind, target):
+    """
+    Note a reference, if references are being recorded.
+    Page urls are recorded in lower case, as some databases (e.g.,
+    SQLite) match the url lookups case insensitively.
+    """
+    recorder = getattr(_local, "recorder", None)
+    if recorder is not None and target:
+        if kind == PAGE:
+            target = target.lower()
+        recorder.add(kind, target)
+
+
+#######################################################################
+
+
+def store(page, references):
+    """
+    Replace the stored references of a (saved) page.
+    """
+    from .models import PageDependency
+
+    with transaction.atomic():
+        PageDependency.objects.filter(page_id=page.pk).delete()
+        PageDependency.objects.bulk_create(
+            [
+                PageDependency(page_id=page.pk, kind=kind, target=target)
+                for kind, target in sorted(references)
+            ]
+        )
+
+
+def store_rendered(page):
+    """
+    Store the references recorded when the page was last rendered
+    with rendering.render_page(), if it has been.
+    """
+    references = page.__dict__.pop("_rendered_references", None)
+    if references is not None:
+        store(page, references)
+
+
+def suffix_candidates(url):
+    """
+    The urls a reference to the given page url may have been made by:
+    the url, and each of its shorter (segment) suffixes; in lower case,
+    as they are recorded.
+    """
+    url = url.lower()
+    parts = url_parts(url)
+    trailing = "/" if url.endswith("/") else ""
+    candidates = {url}
+    for i in range(len(parts)):
+        candidates.add("/" + "/".join(parts[i:]) + trailing)
+    return candidates
+
+
+def invalidate(kind, targets, exclude_pk=None):
+    """
+    Mark the stored html of every page that referenced one of the
+    targets as stale (and note the time, for the page validators),
+    and purge their cached responses.
+    Returns the primary keys of those pages.
+    """
+    from .models import Page, PageDependency
+
+    pks = set(
+        PageDependency.objects.filter(kind=kind, target__in=targets).values_list(
+            "page_id", flat=True
+        )
+    )
+    pks.discard(exclude_pk)
+    if pks:
+        Page.objects.filter(pk__in=pks).update(
+            rendered_hash="", dependencies_modified=timezone.now()
+        )
+        # the page resolution cache holds page instances.
+        clear_page_caches(())
+        response_cache.purge_tags(["page:{}".format(pk) for pk in pks])
+    return pks
+
+
+def page_changed(page):
+    """
+    Invalidate the pages that referenced the given page, by its
+    current url, or by the url it had when it was loaded.
+    """
+    targets = suffix_candidates(page.url)
+    loaded_url = getattr(page, "_loaded_url", None)
+    if loaded_url and loaded_url != page.url:
+        targets |= suffix_candidates(loaded_url)
+    return invalidate(PAGE, targets, exclude_pk=page.pk)
+
+
+def sitefile_changed(sitefile):
+    """
+    Invalidate the pages that referenced the given sitefile.
+    """
+    return invalidate(SITEFILE, [sitefile.slug])
+
+
+#######################################################################
@@ -0,0 +1,85 @@
+"""
+File url resolution for assets and sitefiles.
+
+``storage.url(name)`` may be expensive (e.g., a remote storage
+backend); when a storage has a fixed base url, file urls are built
+from it instead.  The base url is found once per storage: it is the
+'storage_base_url' setting, or the ``base_url`` of a storage that
+builds its urls the way FileSystemStorage does (i.e., does not
+override ``url()``).  Other storages are asked for each url.
+"""
+#######################################################################
+from __future__ import print_function, unicode_literals
+
+from django.core.files.storage import FileSystemStorage
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.encoding import filepath_to_uri
+
+from . import conf
+
+#######################################################################
+
+# no base url; ask the storage
+NO_BASE_URL = ""
+
+# id(storage) -> base url (or NO_BASE_URL)
+_base_urls = {}
+
+
+def get_base_url(storage):
+    """
+    The (memoized) base url for files in storage, or NO_BASE_URL.
+    """
+    key = id(storage)
+    base_url = _base_urls.get(key)
+    if base_url is None:
+        base_url = conf.get("storage_base_url")
+        if base_url is None:
+            base_url = NO_BASE_URL
+            # (storage may be lazy, like default_storage)
+            if getattr(storage.url, "__func__", None) is FileSystemStorage.url:
+                base_url = storage.base_url or NO_BASE_URL
+        if base_url and not base_url.endswith("/"):
+            base_url += "/"
+        _base_urls[key] = base_url
+    return base_url
+
+
+@receiver(setting_changed)
+def _reset(setting, **kwargs):
+    if setting in (conf.CONFIG_NAME, "MEDIA_URL"):
+        _base_urls.clear()
+
+
+def file_url(field_file):
+    """
+    Like ``field_file.url``, without a storage call when the storage
+    has a base url.
+    """
+    if not field_file:
+        raise ValueError(
+            "The '%s' attribute has no file associated with it."
+            % field_file.field.name
+        )
+    base_url = get_base_url(field_file.storage)
+    if base_url:
+        return base_url + filepath_to_uri(field_file.name).lstrip("/")
+    return field_file.url
+
+
+def prefetch_asset_urls(assets):
+    """
+    Resolve the urls of a list of assets in one pass; afterwards
+    ``asset.get_absolute_url()`` does no further work.
+    Returns the list.
+    """
+    for asset in assets:
+        if asset.file:
+            asset._url = file_url(asset.file)
+        else:
+            asset._url = ""
+    return assets
+
+
+#######################################################################
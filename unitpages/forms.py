@@ -4,13 +4,14 @@ Unitpages editing form.
 #######################################################################
 
 from django import forms
-from django.conf import settings
+from django.db.models.fields.files import FieldFile
 from django.contrib.staticfiles.storage import staticfiles_storage
-from django.utils.translation import ugettext
 from django.utils.translation import ugettext_lazy as _
 from markuphelpers.forms import LinedTextareaWidget, ReStructuredTextFormMixin
 
+from .files import file_url, prefetch_asset_urls
 from .models import Asset, Page, SiteFile
+from .validation import UrlValidator, check_url_format
 
 #######################################################################
 
@@ -36,35 +37,13 @@ class PageBaseForm(ReStructuredTextFormMixin, forms.ModelForm):
     # Similar to  django.contrib.flatpages.forms
     def clean_url(self):
         url = self.cleaned_data["url"]
-        if not url.startswith("/"):
-            raise forms.ValidationError(
-                ugettext("URL is missing a leading slash."),
-                code="missing_leading_slash",
-            )
+        check_url_format(url)
 
-        if (
-            settings.APPEND_SLASH
-            and (
-                (
-                    settings.MIDDLEWARE
-                    and "django.middleware.common.CommonMiddleware"
-                    in settings.MIDDLEWARE
-                )
-                or "django.middleware.common.CommonMiddleware"
-                in settings.MIDDLEWARE_CLASSES
-            )
-            and not url.endswith("/")
-        ):
-            raise forms.ValidationError(
-                ugettext("URL is missing a trailing slash."),
-                code="missing_trailing_slash",
-            )
-
-        same_url = Page.objects.filter(url=url)
-        if self.instance.pk:
-            same_url = same_url.exclude(pk=self.instance.pk)
-
-        if same_url.exists():
+        # a formset shares one validator between its forms.
+        url_validator = getattr(self, "url_validator", None)
+        if url_validator is None:
+            url_validator = UrlValidator()
+        if url_validator.is_duplicate(url, exclude_pk=self.instance.pk):
             raise forms.ValidationError(
                 _("Page with url %(url)s already exists"),
                 code="duplicate_url",
@@ -77,6 +56,44 @@ class PageBaseForm(ReStructuredTextFormMixin, forms.ModelForm):
 #######################################################################
 
 
+class BasePageFormSet(forms.BaseModelFormSet):
+    """
+    A page formset which checks the urls of all of its forms
+    with a single query, e.g.,
+    ``modelformset_factory(Page, form=PageForm, formset=BasePageFormSet)``.
+    """
+
+    def full_clean(self):
+        url_validator = UrlValidator()
+        urls = []
+        for form in self.forms:
+            form.url_validator = url_validator
+            if form.is_bound and "url" in form.fields:
+                url = form.data.get(form.add_prefix("url"))
+                if url:
+                    urls.append(url)
+        url_validator.prime(urls)
+        super(BasePageFormSet, self).full_clean()
+
+    def clean(self):
+        super(BasePageFormSet, self).clean()
+        seen = set()
+        for form in self.forms:
+            url = getattr(form, "cleaned_data", {}).get("url")
+            if url is None:
+                continue
+            if url in seen:
+                raise forms.ValidationError(
+                    _("Page with url %(url)s already exists"),
+                    code="duplicate_url",
+                    params={"url": url},
+                )
+            seen.add(url)
+
+
+#######################################################################
+
+
 class AdminPageForm(PageBaseForm):
     """
     A form for the Django admin unitpages.
@@ -133,9 +150,50 @@ class PageForm(PageBaseForm):
 #######################################################################
 
 
-def get_asset_formset_class(
-    form=forms.ModelForm, formset=forms.BaseInlineFormSet, **kwargs
-):
+class _CurrentFile(object):
+    """
+    What FileUrlInput shows for a stored file.
+    """
+
+    def __init__(self, field_file):
+        self.name = field_file.name
+        self.url = file_url(field_file)
+
+    def __str__(self):
+        return self.name
+
+
+class FileUrlInput(forms.ClearableFileInput):
+    """
+    A ClearableFileInput that finds the url of the current file once,
+    with files.file_url(), rather than asking the storage each time.
+    """
+
+    def is_initial(self, value):
+        if isinstance(value, FieldFile):
+            return bool(value)
+        return super(FileUrlInput, self).is_initial(value)
+
+    def format_value(self, value):
+        if isinstance(value, FieldFile) and value:
+            return _CurrentFile(value)
+        return super(FileUrlInput, self).format_value(value)
+
+
+class AssetFormSet(forms.BaseInlineFormSet):
+    """
+    An asset formset which resolves the asset urls in one pass.
+    """
+
+    def get_queryset(self):
+        if not hasattr(self, "_asset_list"):
+            queryset = super(AssetFormSet, self).get_queryset()
+            self._asset_list = prefetch_asset_urls(list(queryset))
+        return self._asset_list
+
+
+def get_asset_formset_class(form=forms.ModelForm, formset=AssetFormSet, **kwargs):
+    kwargs.setdefault("widgets", {"file": FileUrlInput})
     return forms.inlineformset_factory(Page, Asset, form, formset, **kwargs)
 
 
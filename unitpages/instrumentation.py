@@ -0,0 +1,219 @@
+"""
+Opt-in, per-request performance instrumentation for unitpages.
+
+When the 'instrumentation' setting is on, each ``unitpage`` request
+records the time spent (and SQL queries run) in each stage:
+page lookup, breadcrumbs, template tag lookups, the prerender template
+pass and docutils.  The results are
+
+* sent in a ``Server-Timing`` response header,
+* available to templates as ``unitpages_timings`` (see
+  ``context_processor``) and to code as ``request.unitpages_timings``,
+* passed to each of the 'instrumentation_sinks' callables, as
+  ``sink(request, recorder)``.
+
+When it is off, ``stage()`` costs a thread-local attribute lookup.
+"""
+#######################################################################
+from __future__ import print_function, unicode_literals
+
+import functools
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from . import conf
+
+#######################################################################
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+#######################################################################
+
+
+class Recorder(object):
+    """
+    Timings and query counts for one request.
+    """
+
+    def __init__(self):
+        self.stages = OrderedDict()
+        self.queries = 0
+        self.started = time.perf_counter()
+        self.duration = None
+
+    def __call__(self, execute, sql, params, many, context):
+        # a database execute_wrapper, counting queries.
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def add(self, name, duration, queries):
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = {"duration": 0.0, "queries": 0, "count": 0}
+        stage["duration"] += duration
+        stage["queries"] += queries
+        stage["count"] += 1
+
+    def stop(self):
+        self.duration = time.perf_counter() - self.started
+
+    def as_dict(self):
+        """
+        Durations are in milliseconds.
+        """
+        result = OrderedDict()
+        for name, stage in self.stages.items():
+            result[name] = dict(stage, duration=stage["duration"] * 1000.0)
+        result["total"] = {
+            "duration": (self.duration or 0.0) * 1000.0,
+            "queries": self.queries,
+            "count": 1,
+        }
+        return result
+
+    def server_timing(self):
+        """
+        The value for a Server-Timing header.
+        """
+        return ", ".join(
+            '{};dur={:.2f};desc="{} queries"'.format(
+                name, stage["duration"], stage["queries"]
+            )
+            for name, stage in self.as_dict().items()
+        )
+
+
+class _Stage(object):
+
+    __slots__ = ("recorder", "name", "started", "queries")
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.queries = self.recorder.queries
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.recorder.add(
+            self.name,
+            time.perf_counter() - self.started,
+            self.recorder.queries - self.queries,
+        )
+
+
+class _NullStage(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_null_stage = _NullStage()
+
+#######################################################################
+
+
+def get_recorder():
+    """
+    The Recorder for the current request, or None.
+    """
+    return getattr(_local, "recorder", None)
+
+
+def stage(name):
+    """
+    Context manager timing the named stage of the current request:
+
+        with instrumentation.stage("lookup"):
+            ...
+    """
+    recorder = getattr(_local, "recorder", None)
+    if recorder is None:
+        return _null_stage
+    return _Stage(recorder, name)
+
+
+def context_processor(request):
+    """
+    Adds ``unitpages_timings`` (a Recorder, or None) to the context.
+    """
+    return {"unitpages_timings": get_recorder()}
+
+
+#######################################################################
+
+
+def logging_sink(request, recorder):
+    """
+    Log the timings (at DEBUG level).
+    """
+    logger.debug("%s %s", request.path, recorder.as_dict())
+
+
+def make_statsd_sink(client, prefix="unitpages"):
+    """
+    Return a sink reporting to a statsd-style client, i.e., one
+    with ``timing(name, ms)`` and ``incr(name, count)`` methods.
+    """
+
+    def sink(request, recorder):
+        for name, stage in recorder.as_dict().items():
+            client.timing("{}.{}".format(prefix, name), stage["duration"])
+            client.incr("{}.{}.queries".format(prefix, name), stage["queries"])
+
+    return sink
+
+
+def get_sinks():
+    sinks = []
+    for sink in conf.get("instrumentation_sinks"):
+        if not callable(sink):
+            sink = import_string(sink)
+        sinks.append(sink)
+    return sinks
+
+
+#######################################################################
+
+
+def instrumented(view):
+    """
+    View decorator: record the request when instrumentation is on.
+    """
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not conf.get("instrumentation") or get_recorder() is not None:
+            return view(request, *args, **kwargs)
+        recorder = _local.recorder = Recorder()
+        request.unitpages_timings = recorder
+        try:
+            with connection.execute_wrapper(recorder):
+                response = view(request, *args, **kwargs)
+        finally:
+            recorder.stop()
+            _local.recorder = None
+        if conf.get("instrumentation_header"):
+            response["Server-Timing"] = recorder.server_timing()
+        for sink in get_sinks():
+            try:
+                sink(request, recorder)
+            except Exception:
+                logger.exception("unitpages instrumentation sink %r failed", sink)
+        return response
+
+    return wrapper
+
+
+#######################################################################
@@ -0,0 +1,60 @@
+"""
+Export pages, sitefiles and assets.
+"""
+#######################################################################
+from __future__ import print_function, unicode_literals
+
+import io
+import sys
+
+from django.core.management.base import BaseCommand
+
+from ...transfer import write_archive, write_jsonl
+
+#######################################################################
+
+
+class Command(BaseCommand):
+    help = (
+        "Export pages, sitefiles and assets as JSON lines, or as a tar archive "
+        + "which also includes the stored files"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-o", "--output", default="-", help="Output file (default: stdout)"
+        )
+        parser.add_argument(
+            "--format",
+            choices=["jsonl", "tar", "tar.gz"],
+            default="jsonl",
+            help="Output format",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of rows fetched from the database at a time",
+        )
+
+    def handle(self, *args, **options):
+        to_stdout = options["output"] == "-"
+        if options["format"] == "jsonl":
+            if to_stdout:
+                count = write_jsonl(sys.stdout, options["batch_size"])
+            else:
+                with io.open(options["output"], "w", encoding="utf-8") as f:
+                    count = write_jsonl(f, options["batch_size"])
+        else:
+            mode = "w|gz" if options["format"] == "tar.gz" else "w|"
+            if to_stdout:
+                count = write_archive(sys.stdout.buffer, mode, options["batch_size"])
+            else:
+                with open(options["output"], "wb") as f:
+                    count = write_archive(f, mode, options["batch_size"])
+
+        if options["verbosity"] > 0 and not to_stdout:
+            self.stdout.write("Exported {} record(s).".format(count))
+
+
+#######################################################################
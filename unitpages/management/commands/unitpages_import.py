@@ -0,0 +1,83 @@
+"""
+Import pages, sitefiles and assets.
+"""
+#######################################################################
+from __future__ import print_function, unicode_literals
+
+import io
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...transfer import TransferError, import_archive, import_jsonl
+
+#######################################################################
+
+
+class Command(BaseCommand):
+    help = (
+        "Import pages, sitefiles and assets from JSON lines or a tar archive "
+        + "(see unitpages_export).  The import is all or nothing.  "
+        + "Imported pages are not pre-rendered; run unitpages_render afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("input", help="Input file, or - for stdin")
+        parser.add_argument(
+            "--format",
+            choices=["auto", "jsonl", "tar"],
+            default="auto",
+            help="Input format (tar includes compressed archives)",
+        )
+        parser.add_argument(
+            "--update",
+            action="store_true",
+            default=False,
+            help="Update pages and sitefiles that already exist",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of records written to the database at a time",
+        )
+
+    def get_format(self, options):
+        fmt = options["format"]
+        if fmt != "auto":
+            return fmt
+        name = options["input"]
+        if name == "-":
+            raise CommandError("Use --format when reading from stdin")
+        if name.endswith((".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")):
+            return "tar"
+        return "jsonl"
+
+    def handle(self, *args, **options):
+        fmt = self.get_format(options)
+        kwargs = {"update": options["update"], "batch_size": options["batch_size"]}
+        from_stdin = options["input"] == "-"
+        try:
+            if fmt == "tar":
+                if from_stdin:
+                    counts = import_archive(sys.stdin.buffer, **kwargs)
+                else:
+                    with open(options["input"], "rb") as f:
+                        counts = import_archive(f, **kwargs)
+            else:
+                if from_stdin:
+                    counts = import_jsonl(sys.stdin, **kwargs)
+                else:
+                    with io.open(options["input"], encoding="utf-8") as f:
+                        counts = import_jsonl(f, **kwargs)
+        except TransferError as e:
+            raise CommandError(str(e))
+
+        if options["verbosity"] > 0:
+            self.stdout.write(
+                "Imported {page} page(s), {sitefile} sitefile(s), "
+                "{asset} asset(s).".format(**counts)
+            )
+
+
+#######################################################################
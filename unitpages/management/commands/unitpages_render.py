@@ -0,0 +1,65 @@
+"""
+Rebuild the stored, pre-rendered html for pages.
+"""
+#######################################################################
+from __future__ import print_function, unicode_literals
+
+from django.core.management.base import BaseCommand
+
+from ...models import Page
+from ...rendering import RENDER_FIELDS, is_stale, store_pages
+
+#######################################################################
+
+
+class Command(BaseCommand):
+    help = "Rebuild the pre-rendered html for page content"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            default=False,
+            help="Render every page, not just the stale ones",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of pages fetched from the database at a time",
+        )
+        parser.add_argument("url", nargs="*", help="Only render these page urls")
+
+    def handle(self, *args, **options):
+        qs = Page.objects.all()
+        if options["url"]:
+            qs = qs.filter(url__in=options["url"])
+        qs = qs.only("pk", "url", "content", "live_render", *RENDER_FIELDS)
+
+        count = 0
+        batch = []
+        for page in qs.iterator(chunk_size=options["batch_size"]):
+            if not options["force"] and not is_stale(page):
+                continue
+            batch.append(page)
+            if len(batch) >= options["batch_size"]:
+                count += self.render(batch, options)
+                batch = []
+        count += self.render(batch, options)
+
+        if options["verbosity"] > 0:
+            self.stdout.write("Rendered {} page(s).".format(count))
+
+    def render(self, pages, options):
+        """
+        Render a batch of pages (all at once, so a process pool renderer
+        can use every core), and store the results.
+        """
+        store_pages(pages)
+        if options["verbosity"] > 1:
+            for page in pages:
+                self.stdout.write(page.url)
+        return len(pages)
+
+
+#######################################################################
@@ -0,0 +1,35 @@
+"""
+Rebuild the built-in page search index.
+"""
+#######################################################################
+from __future__ import print_function, unicode_literals
+
+from django.core.management.base import BaseCommand
+
+from ... import search
+
+#######################################################################
+
+
+class Command(BaseCommand):
+    help = "Rebuild the built-in search index (see unitpages.search) for all pages"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of pages fetched from the database at a time",
+        )
+
+    def handle(self, *args, **options):
+        count = search.rebuild(batch_size=options["batch_size"])
+        if options["verbosity"] > 0:
+            self.stdout.write(
+                "Indexed {} page(s) with the {} backend.".format(
+                    count, search.get_backend().name
+                )
+            )
+
+
+#######################################################################
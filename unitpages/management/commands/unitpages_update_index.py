@@ -0,0 +1,95 @@
+"""
+Incrementally update the Haystack index for pages.
+"""
+#######################################################################
+from __future__ import print_function, unicode_literals
+
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from haystack import connections
+from haystack.constants import DEFAULT_ALIAS
+
+from ...models import Page
+
+#######################################################################
+
+
+class Command(BaseCommand):
+    help = (
+        "Update the search index for pages modified since a given time; "
+        + "pages that are no longer active or public are removed"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since", help="Only pages modified since this (ISO 8601) date/time"
+        )
+        parser.add_argument(
+            "--age", type=int, help="Only pages modified in the last AGE hours"
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of pages sent to the search backend at a time",
+        )
+        parser.add_argument(
+            "--using", default=DEFAULT_ALIAS, help="The haystack connection to use"
+        )
+
+    def get_start_date(self, options):
+        if options["since"] and options["age"] is not None:
+            raise CommandError("Use only one of --since and --age")
+        if options["age"] is not None:
+            return timezone.now() - datetime.timedelta(hours=options["age"])
+        if options["since"]:
+            start_date = parse_datetime(options["since"])
+            if start_date is None:
+                date = parse_date(options["since"])
+                if date is not None:
+                    start_date = datetime.datetime.combine(date, datetime.time())
+            if start_date is None:
+                raise CommandError("Invalid date/time: %r" % options["since"])
+            if timezone.is_naive(start_date):
+                start_date = timezone.make_aware(start_date)
+            return start_date
+        return None
+
+    def handle(self, *args, **options):
+        start_date = self.get_start_date(options)
+        using = options["using"]
+        batch_size = options["batch_size"]
+
+        backend = connections[using].get_backend()
+        index = connections[using].get_unified_index().get_index(Page)
+
+        updated = 0
+        batch = []
+        qs = index.build_queryset(using=using, start_date=start_date)
+        for page in qs.iterator(chunk_size=batch_size):
+            batch.append(page)
+            if len(batch) >= batch_size:
+                index.prepare_previews(batch)
+                backend.update(index, batch)
+                updated += len(batch)
+                batch = []
+        if batch:
+            index.prepare_previews(batch)
+            backend.update(index, batch)
+            updated += len(batch)
+
+        removed = 0
+        for page in index.removed_queryset(start_date).iterator(chunk_size=batch_size):
+            index.remove_object(page, using=using)
+            removed += 1
+
+        if options["verbosity"] > 0:
+            self.stdout.write(
+                "Updated {} page(s), removed {} page(s).".format(updated, removed)
+            )
+
+
+#######################################################################
@@ -0,0 +1,32 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("unitpages", "0011_auto_20190211_1506")]
+
+    operations = [
+        migrations.AddField(
+            model_name="page",
+            name="live_render",
+            field=models.BooleanField(
+                default=False,
+                help_text="Check this if the page content depends on the request (e.g., the current user); it will then be rendered every time the page is viewed.",
+            ),
+        ),
+        migrations.AddField(
+            model_name="page",
+            name="rendered_content",
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name="page",
+            name="rendered_hash",
+            field=models.CharField(blank=True, editable=False, max_length=40),
+        ),
+        migrations.AddField(
+            model_name="page",
+            name="rendered_version",
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+    ]
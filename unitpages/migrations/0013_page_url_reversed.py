@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+def forward_data(apps, schema_editor):
+    """
+    Forward data migration: populate 'url_reversed' from 'url'
+    """
+    Page = apps.get_model("unitpages", "Page")
+    for pk, url in Page.objects.values_list("pk", "url").iterator():
+        Page.objects.filter(pk=pk).update(url_reversed=url[::-1])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("unitpages", "0012_page_rendered_content")]
+
+    operations = [
+        migrations.AddField(
+            model_name="page",
+            name="url_reversed",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=100
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(forward_data, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,148 @@
+import math
+import re
+from collections import Counter
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import DatabaseError, migrations, models, transaction
+
+# A copy of the unitpages.search tokenizer and table names as of this
+# migration; migrations must not depend on application code.
+SQLITE_TABLE = "unitpages_page_fts"
+POSTGRES_TABLE = "unitpages_page_search"
+
+TITLE_BOOST = 4.0
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+TOKEN_MAX_LENGTH = 32
+STOP_WORDS = frozenset(
+    """
+    a an and are as at be but by for if in into is it no not of on or
+    such that the their then there these they this to was will with
+    """.split()
+)
+
+
+def tokenize(text):
+    return [
+        token
+        for token in TOKEN_RE.findall(text.lower())
+        if len(token) <= TOKEN_MAX_LENGTH and token not in STOP_WORDS
+    ]
+
+
+def token_weights(page):
+    weights = {}
+    for text, boost in ((page.title, TITLE_BOOST), (page.content, 1.0)):
+        for token, count in Counter(tokenize(text)).items():
+            weight = boost * (1.0 + math.log(count))
+            weights[token] = weights.get(token, 0.0) + weight
+    return weights
+
+
+def search_config():
+    config = getattr(settings, "UNITPAGES_CONFIG", {})
+    return config.get("search_config", "english")
+
+
+def forward_data(apps, schema_editor):
+    """
+    Create the database specific search table (when supported),
+    and index the existing pages in it, or else in the token table.
+    """
+    Page = apps.get_model("unitpages", "Page")
+    SearchToken = apps.get_model("unitpages", "SearchToken")
+    page_table = Page._meta.db_table
+    vendor = schema_editor.connection.vendor
+    fulltext = False
+
+    if vendor == "sqlite":
+        try:
+            with transaction.atomic(using=schema_editor.connection.alias):
+                schema_editor.execute(
+                    "CREATE VIRTUAL TABLE {} USING fts5(title, content)".format(
+                        SQLITE_TABLE
+                    )
+                )
+        except DatabaseError:
+            pass  # no FTS5 in this SQLite; the token table is used instead.
+        else:
+            fulltext = True
+            schema_editor.execute(
+                "INSERT INTO {} (rowid, title, content) "
+                "SELECT id, title, content FROM {}".format(SQLITE_TABLE, page_table)
+            )
+    elif vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE TABLE {0} ("
+            "page_id integer PRIMARY KEY REFERENCES {1} (id) "
+            "ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+            "document tsvector NOT NULL)".format(POSTGRES_TABLE, page_table)
+        )
+        schema_editor.execute(
+            "CREATE INDEX {0}_document ON {0} USING gin (document)".format(
+                POSTGRES_TABLE
+            )
+        )
+        schema_editor.execute(
+            "INSERT INTO {} (page_id, document) SELECT id, "
+            "setweight(to_tsvector(%s::regconfig, title), 'A') || "
+            "setweight(to_tsvector(%s::regconfig, content), 'D') "
+            "FROM {}".format(POSTGRES_TABLE, page_table),
+            [search_config()] * 2,
+        )
+        fulltext = True
+
+    if fulltext:
+        return
+    rows = []
+    for page in Page.objects.only("pk", "title", "content").iterator():
+        rows.extend(
+            SearchToken(page_id=page.pk, token=token, weight=weight)
+            for token, weight in token_weights(page).items()
+        )
+        if len(rows) >= 5000:
+            SearchToken.objects.bulk_create(rows)
+            rows = []
+    SearchToken.objects.bulk_create(rows)
+
+
+def reverse_data(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS {}".format(SQLITE_TABLE))
+    elif vendor == "postgresql":
+        schema_editor.execute("DROP TABLE IF EXISTS {}".format(POSTGRES_TABLE))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("unitpages", "0013_page_url_reversed")]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchToken",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("token", models.CharField(max_length=32)),
+                ("weight", models.FloatField()),
+                (
+                    "page",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="unitpages.Page",
+                    ),
+                ),
+            ],
+            options={"unique_together": {("token", "page")}},
+        ),
+        migrations.RunPython(forward_data, reverse_data),
+    ]
@@ -0,0 +1,44 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("unitpages", "0014_searchtoken")]
+
+    operations = [
+        migrations.CreateModel(
+            name="PageDependency",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("page", "page"), ("sitefile", "sitefile")],
+                        max_length=8,
+                    ),
+                ),
+                ("target", models.CharField(max_length=100)),
+                (
+                    "page",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="dependencies",
+                        to="unitpages.Page",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("page", "kind", "target")},
+                "index_together": {("kind", "target")},
+            },
+        )
+    ]
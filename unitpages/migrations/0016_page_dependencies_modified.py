@@ -0,0 +1,14 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("unitpages", "0015_pagedependency")]
+
+    operations = [
+        migrations.AddField(
+            model_name="page",
+            name="dependencies_modified",
+            field=models.DateTimeField(editable=False, null=True),
+        )
+    ]
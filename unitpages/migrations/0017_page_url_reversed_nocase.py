@@ -0,0 +1,54 @@
+from django.db import migrations
+
+INDEX_NAME = "unitpages_page_url_reversed_nocase"
+
+
+def forward(apps, schema_editor):
+    """
+    SQLite only uses an index for a (case insensitive) LIKE, as in
+    url_reversed__startswith, when the index has the NOCASE collation.
+    (PostgreSQL already has a varchar_pattern_ops index for it, which
+    Django creates for indexed CharFields.)
+    """
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    Page = apps.get_model("unitpages", "Page")
+    schema_editor.execute(
+        "CREATE INDEX {} ON {} (url_reversed COLLATE NOCASE)".format(
+            INDEX_NAME, Page._meta.db_table
+        )
+    )
+
+
+def lower_page_references(apps, schema_editor):
+    """
+    Page references are now recorded in lower case.
+    """
+    PageDependency = apps.get_model("unitpages", "PageDependency")
+    references = list(PageDependency.objects.filter(kind="page"))
+    seen = {(d.page_id, d.target) for d in references if d.target == d.target.lower()}
+    for dependency in references:
+        key = (dependency.page_id, dependency.target.lower())
+        if dependency.target == key[1]:
+            continue
+        if key in seen:
+            dependency.delete()
+        else:
+            seen.add(key)
+            dependency.target = key[1]
+            dependency.save(update_fields=["target"])
+
+
+def reverse(apps, schema_editor):
+    if schema_editor.connection.vendor == "sqlite":
+        schema_editor.execute("DROP INDEX IF EXISTS {}".format(INDEX_NAME))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("unitpages", "0016_page_dependencies_modified")]
+
+    operations = [
+        migrations.RunPython(forward, reverse),
+        migrations.RunPython(lower_page_references, migrations.RunPython.noop),
+    ]
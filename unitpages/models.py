@@ -10,10 +10,21 @@ import os
 from django.conf import settings
 from django.db import models
 from django.urls import get_script_prefix
-from django.utils.encoding import iri_to_uri, python_2_unicode_compatible
+from django.utils.encoding import iri_to_uri
+from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext_lazy as _
 
-from . import conf
+from . import conf, dependencies, instrumentation, rendering
+from .files import file_url, prefetch_asset_urls
+from .tree import PageEntry, page_tree, url_parts
+
+try:
+    from django.utils.encoding import python_2_unicode_compatible
+except ImportError:  # Django >= 3.0 (Python 3 only)
+
+    def python_2_unicode_compatible(klass):
+        return klass
+
 
 ###############
 
@@ -65,7 +76,7 @@ class SiteFile(UnitpageBaseModel):
     )
 
     def get_absolute_url(self):
-        return self.file.url
+        return file_url(self.file)
 
     def __str__(self):
         return self.slug
@@ -82,15 +93,70 @@ class Page(UnitpageBaseModel):
     )
 
     url = models.CharField(_("URL"), max_length=100, db_index=True)
+    # The url, reversed: "url ends with x" becomes an indexable
+    # "url_reversed starts with reversed(x)" (see
+    # templatetags.unitpages_tags.url_suffix_filter).
+    url_reversed = models.CharField(max_length=100, db_index=True, editable=False)
     title = models.CharField(max_length=100, help_text=_("A meaningful title"))
     short_title = models.CharField(
         max_length=32, blank=True, help_text=_("A much shorter alternate title")
     )
     content = models.TextField(blank=True, help_text=conf.get("page_content_help"))
+    live_render = models.BooleanField(
+        default=False,
+        help_text=_(
+            "Check this if the page content depends on the request "
+            + "(e.g., the current user); "
+            + "it will then be rendered every time the page is viewed."
+        ),
+    )
+
+    rendered_content = models.TextField(blank=True, editable=False)
+    rendered_hash = models.CharField(max_length=40, blank=True, editable=False)
+    rendered_version = models.PositiveSmallIntegerField(default=0, editable=False)
+    # when a page or sitefile this page's content references last changed.
+    dependencies_modified = models.DateTimeField(null=True, editable=False)
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Page, cls).from_db(db, field_names, values)
+        # the url as loaded; references to it are invalidated if it changes.
+        instance._loaded_url = instance.__dict__.get("url")
+        return instance
+
+    def save(self, *args, **kwargs):
+        self.url_reversed = self.url[::-1]
+        update_fields = kwargs.get("update_fields", None)
+        if update_fields is not None and "url" in update_fields:
+            update_fields = kwargs["update_fields"] = list(update_fields) + [
+                "url_reversed"
+            ]
+        if conf.get("render_on_save") and (
+            update_fields is None or "content" in update_fields
+        ):
+            rendering.render_page(self)
+            if update_fields is not None:
+                kwargs["update_fields"] = list(update_fields) + [
+                    "rendered_content",
+                    "rendered_hash",
+                    "rendered_version",
+                ]
+        result = super(Page, self).save(*args, **kwargs)
+        dependencies.store_rendered(self)
+        return result
+
+    def get_rendered_content(self):
+        """
+        The stored html for this page, or None if the page content
+        must be rendered live.
+        """
+        if not self.rendered_content or rendering.is_stale(self):
+            return None
+        return mark_safe(self.rendered_content)
+
     def get_short_title_display(self):
         if self.short_title:
             return self.short_title
@@ -99,18 +165,59 @@ class Page(UnitpageBaseModel):
     def get_absolute_url(self):
         return iri_to_uri(get_script_prefix().rstrip("/") + self.url)
 
-    def breadcrumbs(self):
-        parts = self.url.split("/")
-        if not parts[-1]:
-            parts = parts[:-1]
-        if not parts[0]:
-            parts = parts[1:]
+    def assets_with_urls(self):
+        """
+        This page's assets, with their urls already resolved.
+        Use ``prefetch_related("asset_set")`` when listing many pages;
+        the prefetched assets are used without a query.
+        """
+        return prefetch_asset_urls(list(self.asset_set.all()))
+
+    def ancestor_entries(self):
+        """
+        The active ancestor pages (as page tree entries, with pk, url,
+        title, short_title and modified), root first.
+        """
+        if conf.get("page_tree"):
+            return [
+                entry
+                for url, entry in page_tree.ancestors(self.url, settings.APPEND_SLASH)
+                if entry is not None
+            ]
+        url_list = self.ancestor_urls()
+        found = {
+            row[1]: PageEntry(*row)
+            for row in Page.objects.filter(active=True, url__in=url_list).values_list(
+                "pk", "url", "title", "short_title", "modified"
+            )
+        }
+        return [found[url] for url in url_list if url in found]
+
+    def ancestor_urls(self):
+        """
+        The urls of the (possible) ancestor pages, root first.
+        """
+        parts = url_parts(self.url)
         url_list = []
         for i in range(1, len(parts)):
             url_part = "/" + "/".join(parts[:i])
             if settings.APPEND_SLASH:
                 url_part += "/"
             url_list.append(url_part)
+        return url_list
+
+    def breadcrumbs(self):
+        with instrumentation.stage("breadcrumbs"):
+            return self._breadcrumbs()
+
+    def _breadcrumbs(self):
+        if conf.get("page_tree"):
+            return [
+                (url, entry.short_title or entry.title)
+                for url, entry in page_tree.ancestors(self.url, settings.APPEND_SLASH)
+                if entry is not None
+            ]
+        url_list = self.ancestor_urls()
         title_list = []
         page_qs = Page.objects.filter(active=True, url__in=url_list).values_list(
             "url", "title", "short_title"
@@ -143,7 +250,10 @@ class Asset(UnitpageBaseModel):
     description = models.CharField(max_length=250, blank=True)
 
     def get_absolute_url(self):
-        return self.file.url
+        url = getattr(self, "_url", None)
+        if url is None:
+            url = file_url(self.file)
+        return url
 
     get_absolute_url.short_description = "url"
 
@@ -154,6 +264,47 @@ class Asset(UnitpageBaseModel):
         return name
 
 
+############################################################################
+
+
+class PageDependency(models.Model):
+    """
+    A reference from a page's content to another page (by url) or to
+    a sitefile (by slug); see unitpages.dependencies.
+    """
+
+    KIND_CHOICES = [
+        (dependencies.PAGE, _("page")),
+        (dependencies.SITEFILE, _("sitefile")),
+    ]
+
+    page = models.ForeignKey(
+        Page, on_delete=models.CASCADE, related_name="dependencies"
+    )
+    kind = models.CharField(max_length=8, choices=KIND_CHOICES)
+    target = models.CharField(max_length=100)
+
+    class Meta:
+        unique_together = [("page", "kind", "target")]
+        index_together = [("kind", "target")]
+
+
+############################################################################
+
+
+class SearchToken(models.Model):
+    """
+    A row of the built-in page search index; see unitpages.search.
+    """
+
+    token = models.CharField(max_length=32)
+    page = models.ForeignKey(Page, on_delete=models.CASCADE, related_name="+")
+    weight = models.FloatField()
+
+    class Meta:
+        unique_together = [("token", "page")]
+
+
 ############################################################################
 
 #
@@ -0,0 +1,448 @@
+"""
+Page content rendering pipeline.
+
+Page content is rendered in two stages: a Django template pass
+(the ``prerender`` filter) followed by ReStructuredText (the
+``restructuredtext`` filter of the ``markup`` template library).
+The result is stored on the page when it is saved, along with a hash
+of the content and the renderer version, so ordinary page views can
+skip both stages.
+
+The ReStructuredText stage is done by the 'content_renderer': either
+in the calling thread (``InlineRenderer``), or in a pool of worker
+processes (``ProcessPoolRenderer``), which keeps docutils from holding
+the GIL of a serving process and lets bulk rendering use every core.
+The template stage always runs in the calling process.  Text the
+process pool cannot convert (too long, or too slow) is converted
+inline when html is stored (see render_pages()); page views do not
+wait for that, but show the page's last stored html instead (or,
+without any, convert the text inline).
+
+Stored html is rendered with only the page in the template context.
+Content that uses anything else (the request, the user, other context
+processor variables, or the current time) is not stored, and is
+rendered live on each view instead.
+"""
+#######################################################################
+from __future__ import print_function, unicode_literals
+
+import copy
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.template import Context, Engine
+from django.template.defaultfilters import truncatewords_html
+from django.utils.html import strip_tags
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+
+from . import conf, dependencies, instrumentation
+from .cache import LRUCache
+
+#######################################################################
+
+logger = logging.getLogger(__name__)
+
+# Bump this when the rendering pipeline changes in a way that
+# invalidates previously stored html.
+RENDERER_VERSION = 1
+
+# The page fields that hold the stored html.
+RENDER_FIELDS = ("rendered_content", "rendered_hash", "rendered_version")
+
+#######################################################################
+
+
+class RenderingError(Exception):
+    """
+    Raised when the content renderer cannot convert some text.
+    """
+
+
+#######################################################################
+
+
+def content_hash(text):
+    """
+    Return the hash stored alongside rendered content.
+    """
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def get_restructuredtext_filter():
+    """
+    The ``restructuredtext`` filter, exactly as templates use it.
+    """
+    library = Engine.get_default().template_libraries["markup"]
+    return library.filters["restructuredtext"]
+
+
+def _restructuredtext_worker(text):
+    """
+    Convert ReStructuredText in a worker process.
+    """
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+    return str(get_restructuredtext_filter()(text))
+
+
+class InlineRenderer(object):
+    """
+    Converts ReStructuredText in the calling thread.
+    """
+
+    def restructuredtext(self, text):
+        return get_restructuredtext_filter()(text)
+
+    def restructuredtext_many(self, texts):
+        """
+        Convert several texts; returns a list of the html, or (where
+        a conversion failed) the exception raised.
+        """
+        results = []
+        for text in texts:
+            try:
+                results.append(self.restructuredtext(text))
+            except Exception as e:
+                results.append(e)
+        return results
+
+
+class ProcessPoolRenderer(InlineRenderer):
+    """
+    Converts ReStructuredText in a pool of worker processes.
+
+    Text longer than max_size characters, and conversions that take
+    longer than timeout seconds (or that fail in the pool), raise
+    RenderingError; the renderer never converts them in the calling
+    process.  Text that timed out fails at once when tried again.
+    """
+
+    def __init__(self, max_workers=None, timeout=10, max_size=1000000):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_size = max_size
+        # content hashes of the texts that timed out
+        self._timed_out = LRUCache(maxsize=256)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get_executor(self):
+        with self._lock:
+            # a forked process cannot use its parent's pool
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                self._pid = os.getpid()
+            return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _submit(self, text):
+        if self.max_size is not None and len(text) > self.max_size:
+            raise RenderingError("Text is longer than %d characters" % self.max_size)
+        if self._timed_out.get(content_hash(text)):
+            raise RenderingError("Process pool rendering timed out before")
+        try:
+            return self.get_executor().submit(_restructuredtext_worker, text)
+        except (BrokenProcessPool, RuntimeError) as e:
+            self.shutdown()
+            raise RenderingError("Could not use the rendering process pool: %s" % e)
+
+    def _result(self, future, text):
+        try:
+            return mark_safe(future.result(timeout=self.timeout))
+        except FutureTimeoutError:
+            future.cancel()
+            self._timed_out.set(content_hash(text), True)
+            raise RenderingError("Process pool rendering timed out")
+        except BrokenProcessPool as e:
+            self.shutdown()
+            raise RenderingError("The rendering process pool is broken: %s" % e)
+
+    def restructuredtext(self, text):
+        return self._result(self._submit(text), text)
+
+    def restructuredtext_many(self, texts):
+        futures = []
+        for text in texts:
+            try:
+                futures.append(self._submit(text))
+            except RenderingError as e:
+                futures.append(e)
+        results = []
+        for future, text in zip(futures, texts):
+            if isinstance(future, Exception):
+                results.append(future)
+                continue
+            try:
+                results.append(self._result(future, text))
+            except Exception as e:
+                results.append(e)
+        return results
+
+
+_renderer = None
+
+
+def get_renderer():
+    """
+    The 'content_renderer' (created once; reset when the configuration
+    changes).
+    """
+    global _renderer
+    if _renderer is None:
+        renderer = conf.get("content_renderer")
+        if isinstance(renderer, str):
+            renderer = import_string(renderer)
+        if isinstance(renderer, type):
+            renderer = renderer(**conf.get("content_renderer_options"))
+        _renderer = renderer
+    return _renderer
+
+
+@receiver(setting_changed)
+def _reset(setting, **kwargs):
+    global _renderer
+    if setting == conf.CONFIG_NAME:
+        if isinstance(_renderer, ProcessPoolRenderer):
+            _renderer.shutdown()
+        _renderer = None
+
+
+def restructuredtext(text, stored_html=""):
+    """
+    Convert ReStructuredText to html, for a page view.  If the renderer
+    cannot convert the text, the page's last stored html is returned
+    instead; if there is none, the text is converted inline.
+    """
+    with instrumentation.stage("docutils"):
+        try:
+            return get_renderer().restructuredtext(text)
+        except RenderingError as e:
+            logger.warning("Could not render content: %s", e)
+            if stored_html:
+                return mark_safe(stored_html)
+            return InlineRenderer().restructuredtext(text)
+
+
+def restructuredtext_many(texts):
+    """
+    Convert several texts with the renderer's restructuredtext_many();
+    those the renderer cannot convert are converted inline.
+    (For storing html; page views use restructuredtext().)
+    """
+    html_list = get_renderer().restructuredtext_many(texts)
+    retry = [i for i, html in enumerate(html_list) if isinstance(html, RenderingError)]
+    if retry:
+        inline = InlineRenderer().restructuredtext_many([texts[i] for i in retry])
+        for i, html in zip(retry, inline):
+            html_list[i] = html
+    return html_list
+
+
+def prerender(text, context=None):
+    """
+    The template stage of rendering.
+    """
+    from .templatetags.unitpages_tags import render_as_template
+
+    if context is None:
+        context = Context({})
+    return render_as_template(text, context)
+
+
+class _RecordingContext(Context):
+    """
+    A Context that remembers the names looked up in it, but not found,
+    and whether any template rendered with it shows the current time.
+    (Nested renders, like ``prerender_with_context``, push onto this
+    context, so their lookups are seen too.)
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(_RecordingContext, self).__init__(*args, **kwargs)
+        self.missing = set()
+        self.time_dependent = False
+
+    def note_template(self, template):
+        """
+        Called (by render_as_template) for each template rendered.
+        """
+        for node_type in _time_dependent_node_types():
+            if template.nodelist.get_nodes_by_type(node_type):
+                self.time_dependent = True
+
+    def __getitem__(self, key):
+        try:
+            return super(_RecordingContext, self).__getitem__(key)
+        except KeyError:
+            self.missing.add(key)
+            raise
+
+    def get(self, key, otherwise=None):
+        if key not in self:
+            self.missing.add(key)
+        return super(_RecordingContext, self).get(key, otherwise)
+
+
+def _time_dependent_node_types():
+    from django.template.defaulttags import NowNode
+
+    from .templatetags.unitpages_tags import CurrentTimeNode
+
+    return (NowNode, CurrentTimeNode)
+
+
+def prerender_page(page):
+    """
+    The template stage for stored html, with only the page in the
+    context.  Returns None when the content depends on anything else
+    (other context variables or the current time), and so must be
+    rendered live.
+    """
+    context = _RecordingContext({"page": page})
+    text = prerender(page.content, context)
+    if context.missing or context.time_dependent:
+        return None
+    return text
+
+
+def render_content(text, context=None):
+    """
+    Run page text through both rendering stages and return the html.
+    """
+    return restructuredtext(prerender(text, context))
+
+
+def content_preview(page, words=30):
+    """
+    A short, plain text preview of the rendered page content.
+    """
+    return content_previews([page], words)[0]
+
+
+def content_previews(pages, words=30):
+    """
+    content_preview() for several pages.  Pages without fresh stored
+    html are rendered together, with render_pages() (on copies, which
+    are not saved); pages that are rendered live are rendered one by one.
+    """
+    pages = list(pages)
+    html_list = [page.get_rendered_content() for page in pages]
+    missing = [i for i, html in enumerate(html_list) if html is None]
+    copies = [copy.copy(pages[i]) for i in missing]
+    for i, page, rendered in zip(missing, copies, render_pages(copies)):
+        # a failed page keeps its last html
+        html = page.rendered_content
+        if not rendered and not html and page.content:
+            try:
+                html = render_content(page.content, Context({"page": page}))
+            except Exception:
+                logger.exception("Could not render preview for page %r", page.url)
+        html_list[i] = html
+    return [strip_tags(truncatewords_html(html, words)) for html in html_list]
+
+
+def render_page(page):
+    """
+    Render the given page, storing the result on the instance (but
+    not saving it).  Pages flagged for live rendering get their stored
+    html cleared; pages whose content depends on the request (see
+    prerender_page()) get an empty html with the content hash, so they
+    are not stale, but are still rendered live (see
+    Page.get_rendered_content()).  Pages whose content fails to render
+    keep their last html (for views to fall back on), but are stale.
+    Returns True if rendered html was stored.
+    """
+    return render_pages([page])[0]
+
+
+def render_pages(pages):
+    """
+    render_page() for many pages; the ReStructuredText stage is done
+    for all of them at once (in parallel, with a process pool renderer).
+    Returns a list of the render_page() results.
+
+    The references each page makes to other pages and sitefiles are
+    kept on the instance, for dependencies.store_rendered().
+    """
+    results = []
+    todo = []
+    for page in pages:
+        page.rendered_hash = ""
+        page.rendered_version = RENDERER_VERSION
+        page._rendered_references = set()
+        results.append(False)
+        if page.live_render or not page.content:
+            page.rendered_content = ""
+            continue
+        with dependencies.recording() as recorder:
+            try:
+                prerendered = prerender_page(page)
+            except Exception:
+                logger.exception("Could not pre-render page %r", page.url)
+            else:
+                if prerendered is None:
+                    page.rendered_content = ""
+                    page.rendered_hash = content_hash(page.content)
+                else:
+                    todo.append((len(results) - 1, page, prerendered))
+        page._rendered_references = recorder.references
+    with instrumentation.stage("docutils"):
+        html_list = restructuredtext_many([t[2] for t in todo])
+    for (i, page, prerendered), html in zip(todo, html_list):
+        if isinstance(html, Exception):
+            logger.error("Could not pre-render page %r", page.url, exc_info=html)
+            continue
+        page.rendered_content = html
+        page.rendered_hash = content_hash(page.content)
+        results[i] = True
+    return results
+
+
+def store_pages(pages):
+    """
+    render_pages() for (saved) pages, and save the results, and the
+    references recorded, without changing the modification times.
+    Returns the list of render_pages() results.
+    """
+    from .models import Page
+
+    results = render_pages(pages)
+    for page in pages:
+        # .update() does not touch the 'modified' timestamp.
+        Page.objects.filter(pk=page.pk).update(
+            **{name: getattr(page, name) for name in RENDER_FIELDS}
+        )
+        dependencies.store_rendered(page)
+    return results
+
+
+def is_stale(page):
+    """
+    Return True if the stored html does not match the page content.
+    """
+    if page.live_render or not page.content:
+        return bool(page.rendered_hash)
+    return (
+        page.rendered_version != RENDERER_VERSION
+        or page.rendered_hash != content_hash(page.content)
+    )
+
+
+#######################################################################
@@ -0,0 +1,172 @@
+"""
+Optional full-response cache for anonymous page views.
+
+Responses are stored in the Django cache named by the 'response_cache'
+setting.  Each entry is tagged with the pages it was built from: the
+page itself and the ancestors shown in its breadcrumbs (by pk), plus
+the urls of any missing ancestors.  Saving or deleting a Page or Asset
+purges just the entries carrying the matching tags.
+
+Each tag has a version number, kept as a plain cache entry (so any
+cache backend works, including local-memory and file-based caches).
+A response is stored with the versions of its tags, and is only used
+while they are all unchanged; purging a tag just increments its
+version.  Requests with a query string are not cached.
+"""
+#######################################################################
+from __future__ import print_function, unicode_literals
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import conf
+from .tree import page_tree
+
+#######################################################################
+
+KEY_PREFIX = "unitpages.response"
+TAG_PREFIX = "unitpages.tag"
+
+#######################################################################
+
+
+def get_cache():
+    """
+    Return the configured cache, or None when response caching is off.
+    """
+    alias = conf.get("response_cache")
+    if not alias:
+        return None
+    return caches[alias]
+
+
+def _hash(text):
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
+def get_cache_key(request, templates):
+    """
+    The cache key for a page request rendered with the given templates,
+    or None if the request should not be cached.
+    """
+    if request.META.get("QUERY_STRING"):
+        return None
+    parts = [request.get_host(), request.path] + list(templates)
+    return "{}.{}".format(KEY_PREFIX, _hash("|".join(parts)))
+
+
+def _tag_key(tag):
+    return "{}.{}".format(TAG_PREFIX, _hash(tag))
+
+
+def page_tags(page):
+    """
+    Return the invalidation tags for a response showing the given page.
+    """
+    from .models import Page
+
+    tags = ["page:{}".format(page.pk)]
+    ancestor_urls = page.ancestor_urls()
+    if conf.get("page_tree"):
+        found = {
+            url: entry.pk
+            for url, entry in page_tree.ancestors(page.url, settings.APPEND_SLASH)
+            if entry is not None
+        }
+    else:
+        found = dict(
+            Page.objects.filter(active=True, url__in=ancestor_urls).values_list(
+                "url", "pk"
+            )
+        )
+    for url in ancestor_urls:
+        if url in found:
+            tags.append("page:{}".format(found[url]))
+        else:
+            tags.append("url:{}".format(url))
+    return tags
+
+
+def is_cacheable_response(request, response):
+    """
+    Only plain, successful, cookie-free responses are cached.
+    """
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not response.has_header("Set-Cookie")
+        and not request.META.get("CSRF_COOKIE_USED", False)
+    )
+
+
+def fetch(cache, key):
+    """
+    Return the cached response, or None if there is none, or if any
+    of its tags has been purged since it was stored.
+    """
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    versions, response = entry
+    current = cache.get_many(list(versions))
+    if any(current.get(k) != v for k, v in versions.items()):
+        return None
+    return response
+
+
+def store(cache, key, response, tags):
+    """
+    Cache the response, along with the current versions of its tags.
+    """
+    timeout = conf.get("response_cache_timeout")
+    tag_keys = [_tag_key(tag) for tag in tags]
+    versions = cache.get_many(tag_keys)
+    for tag_key in tag_keys:
+        if tag_key not in versions:
+            # a new (or expired) tag starts from a version not used before.
+            cache.add(tag_key, int(time.time() * 1000), timeout)
+            versions[tag_key] = cache.get(tag_key)
+    if None in versions.values():
+        return
+    cache.set(key, (versions, response), timeout)
+
+
+def purge_tags(tags):
+    """
+    Invalidate every cached response stored with any of the tags.
+    """
+    cache = get_cache()
+    if cache is None:
+        return
+    for tag in tags:
+        try:
+            cache.incr(_tag_key(tag))
+        except ValueError:
+            pass  # no version: nothing is stored with this tag.
+
+
+def purge_page(page):
+    """
+    Purge responses affected by a change to the given page.
+    """
+    purge_pages([page])
+
+
+def purge_pages(pages):
+    """
+    Purge responses affected by changes to the given pages (which may
+    be new, and so have no primary key yet).
+    """
+    tags = []
+    for page in pages:
+        if page.pk is not None:
+            tags.append("page:{}".format(page.pk))
+        tags.append("url:{}".format(page.url))
+    purge_tags(tags)
+
+
+#######################################################################
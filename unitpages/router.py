@@ -0,0 +1,48 @@
+"""
+A url pattern that only matches the urls of active pages.
+
+The catch-all page pattern in ``unitpages.urls`` matches any path
+ending with "/", so every request for an unknown path costs a page
+query.  With the 'page_router' setting on, the pattern is checked
+against the urls in the in-memory page tree (see ``unitpages.tree``)
+instead, and unknown paths fail to resolve before the view is called.
+"""
+#######################################################################
+from __future__ import print_function, unicode_literals
+
+from django.urls.resolvers import RegexPattern, URLPattern
+
+from . import conf
+from .tree import page_tree
+
+#######################################################################
+
+
+class PageURLPattern(URLPattern):
+    """
+    A URLPattern whose ``url`` keyword argument must be the url
+    of an active page.
+    """
+
+    def resolve(self, path):
+        match = super(PageURLPattern, self).resolve(path)
+        if match is None or not conf.get("page_router"):
+            return match
+        url = match.kwargs.get("url", "")
+        if not url.startswith("/"):
+            url = "/" + url
+        if not page_tree.has_url(url):
+            return None
+        return match
+
+
+def page_url(regex, view, kwargs=None, name=None):
+    """
+    Like ``django.conf.urls.url()``, for a PageURLPattern.
+    """
+    return PageURLPattern(
+        RegexPattern(regex, name=name, is_endpoint=True), view, kwargs, name
+    )
+
+
+#######################################################################
@@ -0,0 +1,375 @@
+"""
+Built-in full text search for pages.
+
+Pages are kept in a local inverted index that is updated as pages are
+saved and deleted (see ``unitpages.signals``), so no external search
+engine is needed.  There are three backends:
+
+``TokenBackend``
+    a plain table of (token, page, weight) rows; works on any database.
+``SQLiteBackend``
+    an FTS5 virtual table, ranked with bm25().
+``PostgresBackend``
+    a table of weighted tsvector documents with a GIN index,
+    ranked with ts_rank().
+
+The FTS5 and tsvector tables are created by a migration when the
+database supports them.  In every backend, titles count 4 times as
+much as content (like the ``title`` field of the Haystack ``PageIndex``).
+The index can be rebuilt with::
+
+    ./manage.py unitpages_search_index
+"""
+#######################################################################
+from __future__ import print_function, unicode_literals
+
+import math
+import re
+from collections import Counter
+
+from django.core.signals import setting_changed
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.dispatch import receiver
+
+from . import conf
+
+#######################################################################
+
+TITLE_BOOST = 4.0
+
+# Names of the tables created (when supported) by migration 0014.
+SQLITE_TABLE = "unitpages_page_fts"
+POSTGRES_TABLE = "unitpages_page_search"
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+TOKEN_MAX_LENGTH = 32
+
+STOP_WORDS = frozenset(
+    """
+    a an and are as at be but by for if in into is it no not of on or
+    such that the their then there these they this to was will with
+    """.split()
+)
+
+# The fields a page needs to be indexed.
+INDEX_FIELDS = ("pk", "title", "content")
+
+#######################################################################
+
+
+def tokenize(text):
+    """
+    Split text into lower case search tokens.
+    """
+    return [
+        token
+        for token in TOKEN_RE.findall(text.lower())
+        if len(token) <= TOKEN_MAX_LENGTH and token not in STOP_WORDS
+    ]
+
+
+def token_weights(page):
+    """
+    Return {token: weight} for a page; term frequencies are dampened,
+    and title terms boosted.
+    """
+    weights = {}
+    for text, boost in ((page.title, TITLE_BOOST), (page.content, 1.0)):
+        for token, count in Counter(tokenize(text)).items():
+            weight = boost * (1.0 + math.log(count))
+            weights[token] = weights.get(token, 0.0) + weight
+    return weights
+
+
+#######################################################################
+
+
+class TokenBackend(object):
+    """
+    An inverted index in the SearchToken table.
+    """
+
+    name = "token"
+
+    def index_pages(self, pages):
+        from .models import SearchToken
+
+        pages = list(pages)
+        if not pages:
+            return
+        rows = [
+            SearchToken(page_id=page.pk, token=token, weight=weight)
+            for page in pages
+            for token, weight in token_weights(page).items()
+        ]
+        with transaction.atomic():
+            self.remove_pages([page.pk for page in pages])
+            SearchToken.objects.bulk_create(rows, batch_size=500)
+
+    def remove_pages(self, pks):
+        from .models import SearchToken
+
+        SearchToken.objects.filter(page_id__in=pks).delete()
+
+    def clear(self):
+        from .models import SearchToken
+
+        SearchToken.objects.all().delete()
+
+    def search(self, query, public=True, limit=None):
+        from .models import SearchToken
+
+        tokens = set(tokenize(query))
+        if not tokens:
+            return []
+        qs = SearchToken.objects.filter(token__in=tokens)
+        if public:
+            qs = qs.filter(page__active=True, page__public=True)
+        qs = (
+            qs.values("page")
+            .annotate(score=Sum("weight"), matched=Count("token"))
+            .filter(matched=len(tokens))
+            .order_by("-score", "page")
+            .values_list("page", "score")
+        )
+        if limit is not None:
+            qs = qs[:limit]
+        return list(qs)
+
+
+class _SQLBackend(object):
+    """
+    Common code for the backends that use a database specific table.
+    """
+
+    table = None
+
+    def _execute(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+    def remove_pages(self, pks):
+        pks = list(pks)
+        if pks:
+            self._execute(
+                "DELETE FROM {} WHERE {} IN ({})".format(
+                    self.table, self.key_column, ", ".join(["%s"] * len(pks))
+                ),
+                pks,
+            )
+
+    def clear(self):
+        self._execute("DELETE FROM {}".format(self.table))
+
+    def _search(self, sql, params, public, limit):
+        from .models import Page
+
+        page_table = Page._meta.db_table
+        where = ""
+        if public:
+            where = " AND {0}.active = %s AND {0}.public = %s".format(page_table)
+            params += [True, True]
+        sql = sql.format(page_table=page_table, where=where)
+        if limit is not None:
+            sql += " LIMIT %s"
+            params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [tuple(row) for row in cursor.fetchall()]
+
+
+class SQLiteBackend(_SQLBackend):
+    """
+    An SQLite FTS5 index; the page pk is the rowid.
+    """
+
+    name = "sqlite"
+    table = SQLITE_TABLE
+    key_column = "rowid"
+
+    def index_pages(self, pages):
+        pages = list(pages)
+        if not pages:
+            return
+        with transaction.atomic():
+            self.remove_pages([page.pk for page in pages])
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    "INSERT INTO {} (rowid, title, content) "
+                    "VALUES (%s, %s, %s)".format(self.table),
+                    [(page.pk, page.title, page.content) for page in pages],
+                )
+
+    def search(self, query, public=True, limit=None):
+        tokens = sorted(set(tokenize(query)))
+        if not tokens:
+            return []
+        # quoted tokens are implicitly ANDed, and need no escaping
+        match = " ".join('"{}"'.format(token) for token in tokens)
+        # bm25() is lower for better matches
+        rank = "bm25({}, {}, 1.0)".format(self.table, TITLE_BOOST)
+        sql = (
+            "SELECT {table}.rowid, -{rank} FROM {table} "
+            "JOIN {{page_table}} ON {{page_table}}.id = {table}.rowid "
+            "WHERE {table} MATCH %s{{where}} "
+            "ORDER BY {rank}, {table}.rowid"
+        ).format(table=self.table, rank=rank)
+        return self._search(sql, [match], public, limit)
+
+
+class PostgresBackend(_SQLBackend):
+    """
+    A PostgreSQL tsvector index.  Titles have weight A and content
+    weight D; ts_rank() is given weights so that A counts TITLE_BOOST
+    times as much as D.
+    """
+
+    name = "postgresql"
+    table = POSTGRES_TABLE
+    key_column = "page_id"
+    weights = "{{1.0, 1.0, 1.0, {}}}".format(TITLE_BOOST)
+
+    def index_pages(self, pages):
+        pages = list(pages)
+        if not pages:
+            return
+        config = conf.get("search_config")
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                "INSERT INTO {} (page_id, document) VALUES (%s, "
+                "setweight(to_tsvector(%s::regconfig, %s), 'A') || "
+                "setweight(to_tsvector(%s::regconfig, %s), 'D')) "
+                "ON CONFLICT (page_id) DO UPDATE "
+                "SET document = EXCLUDED.document".format(self.table),
+                [
+                    (page.pk, config, page.title, config, page.content)
+                    for page in pages
+                ],
+            )
+
+    def search(self, query, public=True, limit=None):
+        if not tokenize(query):
+            return []
+        sql = (
+            "SELECT {table}.page_id, "
+            "ts_rank(%s::real[], {table}.document, query) AS score "
+            "FROM {table} "
+            "JOIN {{page_table}} ON {{page_table}}.id = {table}.page_id, "
+            "plainto_tsquery(%s::regconfig, %s) query "
+            "WHERE {table}.document @@ query{{where}} "
+            "ORDER BY score DESC, {table}.page_id"
+        ).format(table=self.table)
+        params = [self.weights, conf.get("search_config"), query]
+        return self._search(sql, params, public, limit)
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (TokenBackend, SQLiteBackend, PostgresBackend)
+}
+
+#######################################################################
+
+_backend = None
+
+
+def get_backend():
+    """
+    The configured search backend.  With "auto", a database specific
+    backend is used when its table exists.
+    (Computed once; reset when the configuration changes.)
+    """
+    global _backend
+    if _backend is None:
+        name = conf.get("search_backend")
+        if name == "auto":
+            name = TokenBackend.name
+            tables = {
+                SQLiteBackend.name: SQLiteBackend.table,
+                PostgresBackend.name: PostgresBackend.table,
+            }
+            table = tables.get(connection.vendor)
+            if table and table in connection.introspection.table_names():
+                name = connection.vendor
+        _backend = BACKENDS[name]()
+    return _backend
+
+
+@receiver(setting_changed)
+def _reset(setting, **kwargs):
+    global _backend
+    if setting == conf.CONFIG_NAME:
+        _backend = None
+
+
+#######################################################################
+
+
+def index_pages(pages):
+    """
+    Add (or replace) the given pages in the index.  The pages only
+    need the fields in INDEX_FIELDS.
+    """
+    get_backend().index_pages(pages)
+
+
+def remove_pages(pks):
+    """
+    Remove the pages with the given primary keys from the index.
+    """
+    get_backend().remove_pages(pks)
+
+
+def rebuild(queryset=None, batch_size=500):
+    """
+    Clear the index, and index every page; returns the number of pages.
+    """
+    from .models import Page
+
+    if queryset is None:
+        queryset = Page.objects.all()
+    backend = get_backend()
+    count = 0
+    with transaction.atomic():
+        backend.clear()
+        batch = []
+        for page in queryset.only(*INDEX_FIELDS).iterator(chunk_size=batch_size):
+            batch.append(page)
+            if len(batch) >= batch_size:
+                backend.index_pages(batch)
+                count += len(batch)
+                batch = []
+        backend.index_pages(batch)
+        count += len(batch)
+    return count
+
+
+def search(query, public=True, limit=None):
+    """
+    Return a list of (page pk, score), best matches first.
+    Every word of the query must match.  When public is True, only
+    active, public pages are returned.
+    """
+    return get_backend().search(query, public=public, limit=limit)
+
+
+def search_pages(query, public=True, limit=None):
+    """
+    Like search(), but return the page objects, each with a
+    ``search_score`` attribute.
+    """
+    from .models import Page
+
+    results = search(query, public=public, limit=limit)
+    pages = Page.objects.in_bulk([pk for pk, score in results])
+    page_list = []
+    for pk, score in results:
+        page = pages.get(pk)
+        if page is not None:
+            page.search_score = score
+            page_list.append(page)
+    return page_list
+
+
+#######################################################################
@@ -3,25 +3,104 @@ Haystack search indexes for UnitPages application.
 """
 ###############################################################
 
+from django.template import loader
 from haystack import indexes
+from haystack.utils import get_model_ct_tuple
 
 from .models import Page, SiteFile
+from .rendering import content_previews
+
+###############################################################
+
+
+class CachedTemplateCharField(indexes.CharField):
+    """
+    A CharField whose (use_template) template is looked up once,
+    and then reused for every object prepared.
+    """
+
+    _template = None
+
+    def prepare_template(self, obj):
+        if self._template is None:
+            if self.template_name is not None:
+                template_names = self.template_name
+                if not isinstance(template_names, (list, tuple)):
+                    template_names = [template_names]
+            else:
+                app_label, model_name = get_model_ct_tuple(obj)
+                template_names = [
+                    "search/indexes/%s/%s_%s.txt"
+                    % (app_label, model_name, self.instance_name)
+                ]
+            self._template = loader.select_template(template_names)
+        return self._template.render({"object": obj})
+
 
 ###############################################################
 
 
 class PageIndex(indexes.SearchIndex, indexes.Indexable):
-    text = indexes.CharField(document=True, use_template=True)
+    text = CachedTemplateCharField(document=True, use_template=True)
     pub_date = indexes.DateTimeField(model_attr="modified")
     title = indexes.CharField(model_attr="title", boost=4.0)
+    # stored only; these let search results render without the database.
+    url = indexes.CharField(indexed=False)
+    preview = indexes.CharField(indexed=False)
 
     def get_model(self):
         return Page
 
+    def prepare_url(self, obj):
+        return obj.get_absolute_url()
+
+    def prepare_preview(self, obj):
+        preview = getattr(obj, "_preview", None)
+        if preview is None:
+            preview = content_previews([obj])[0]
+        return preview
+
+    def prepare_previews(self, objs):
+        """
+        Compute the previews of several pages at once (pages without
+        fresh stored html are rendered in one batch); used by
+        ``unitpages_update_index`` before sending a batch.
+        """
+        for obj, preview in zip(objs, content_previews(objs)):
+            obj._preview = preview
+
+    def get_updated_field(self):
+        """
+        Allows incremental updates (e.g., ``update_index --age``).
+        """
+        return "modified"
+
     def index_queryset(self, using=None):
         """Used when the entire index for model is updated."""
         return self.get_model().objects.filter(active=True, public=True)
 
+    def removed_queryset(self, start_date=None):
+        """
+        Pages that should *not* be in the index; optionally only
+        those modified since start_date.
+        """
+        qs = self.get_model().objects.exclude(active=True, public=True)
+        if start_date is not None:
+            qs = qs.filter(modified__gte=start_date)
+        return qs.only("pk")
+
+    def should_index(self, obj):
+        return obj.active and obj.public
+
+    def update_object(self, instance, using=None, **kwargs):
+        """
+        Deactivated and non-public pages are removed from the index.
+        """
+        if not self.should_index(instance):
+            self.remove_object(instance, using=using, **kwargs)
+            return
+        super(PageIndex, self).update_object(instance, using=using, **kwargs)
+
     def prepare(self, obj):
         """
         Do document boosting.
@@ -0,0 +1,86 @@
+"""
+Signal handlers for unitpages.
+
+These are connected in ``PagesConfig.ready()``.
+"""
+#######################################################################
+from __future__ import print_function, unicode_literals
+
+from . import conf, dependencies, response_cache, search
+from .cache import clear_page_caches, clear_sitefile_caches
+from .tree import page_tree
+
+#######################################################################
+
+
+def page_changed(sender, instance, **kwargs):
+    """
+    post_save/post_delete handler for Page objects.
+    """
+    clear_page_caches([instance.pk])
+    response_cache.purge_page(instance)
+
+
+def page_saved(sender, instance, **kwargs):
+    """
+    post_save handler for Page objects.
+    """
+    page_tree.page_saved(instance)
+
+
+def page_deleted(sender, instance, **kwargs):
+    """
+    post_delete handler for Page objects.
+    """
+    page_tree.page_deleted(instance)
+
+
+# Page fields that the page template tags show.
+REFERENCED_FIELDS = {"active", "url", "title", "short_title", "content"}
+
+
+def page_dependents_changed(sender, instance, update_fields=None, **kwargs):
+    """
+    post_save/post_delete handler for Page objects; invalidates
+    the pages whose content references this one.
+    """
+    if update_fields is not None and not REFERENCED_FIELDS & set(update_fields):
+        return
+    dependencies.page_changed(instance)
+
+
+def page_search_saved(sender, instance, update_fields=None, **kwargs):
+    """
+    post_save handler for Page objects; updates the search index.
+    """
+    if not conf.get("search"):
+        return
+    if update_fields is not None and not {"title", "content"} & set(update_fields):
+        return
+    search.index_pages([instance])
+
+
+def page_search_deleted(sender, instance, **kwargs):
+    """
+    post_delete handler for Page objects; updates the search index.
+    """
+    if conf.get("search"):
+        search.remove_pages([instance.pk])
+
+
+def sitefile_changed(sender, instance, **kwargs):
+    """
+    post_save/post_delete handler for SiteFile objects.
+    """
+    clear_sitefile_caches()
+    dependencies.sitefile_changed(instance)
+
+
+def asset_changed(sender, instance, **kwargs):
+    """
+    post_save/post_delete handler for Asset objects.
+    """
+    response_cache.purge_tags(["page:{}".format(instance.page_id)])
+
+
+#######################################################################
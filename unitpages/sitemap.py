@@ -1,9 +1,35 @@
 """
 Sitemap for unitpages application
+
+The Page_Sitemap works with the django.contrib.sitemaps views; for
+large sites, the streaming ``sitemap`` view below can be used with
+the stock sitemap index, e.g.,
+
+    from django.contrib.sitemaps.views import index
+    from unitpages.sitemap import Page_Sitemap, sitemap
+
+    sitemaps = {"pages": Page_Sitemap}
+
+    url(r"^sitemap\\.xml$", index,
+        {"sitemaps": sitemaps, "sitemap_url_name": "unitpages-sitemap"}),
+    url(r"^sitemap-(?P<section>.+)\\.xml$", sitemap,
+        {"sitemaps": sitemaps}, name="unitpages-sitemap"),
+
+Sections are split into pages of ``Page_Sitemap.limit`` urls, and each
+page is streamed from a server-side chunked query.
 """
+import calendar
+import hashlib
+from xml.sax.saxutils import escape
 
 from django.contrib.sitemaps import Sitemap
+from django.contrib.sites.shortcuts import get_current_site
+from django.db.models import Count, Max
+from django.http import Http404, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 
+from . import conf
 from .models import Page
 
 
@@ -15,14 +41,129 @@ class Page_Sitemap(Sitemap):
     #    priority = 0.5
     #    changefreq = 'monthly'
 
+    @property
+    def limit(self):
+        return conf.get("sitemap_limit")
+
+    @property
+    def chunk_size(self):
+        return conf.get("sitemap_chunk_size")
+
     def items(self):
         """
         Return the items for this map
         """
-        return Page.objects.filter(active=True, public=True)
+        return (
+            Page.objects.filter(active=True, public=True)
+            .only("url", "modified")
+            .order_by("url")
+        )
 
     def lastmod(self, item):
         """
         Last Modification datetime.
         """
         return item.modified
+
+    def get_validator_data(self):
+        """
+        Return (latest modification time, number of items); used for
+        the conditional GET handling of the streaming sitemap view.
+        """
+        data = (
+            self.items()
+            .order_by()
+            .aggregate(latest=Max("modified"), count=Count("pk"))
+        )
+        return data["latest"], data["count"]
+
+    def iter_urls(self, page=1, site=None, protocol=None):
+        """
+        Like get_urls(), but a generator over a chunked query, so
+        memory use does not grow with the number of pages.
+        """
+        protocol = protocol or self.protocol or "http"
+        start = (page - 1) * self.limit
+        qs = self.items()[start : start + self.limit]
+        for item in qs.iterator(chunk_size=self.chunk_size):
+            yield {
+                "location": "%s://%s%s" % (protocol, site.domain, self.location(item)),
+                "lastmod": self.lastmod(item),
+            }
+
+
+#######################################################################
+
+
+def _url_xml(url_info):
+    parts = ["<url><loc>", escape(url_info["location"]), "</loc>"]
+    lastmod = url_info.get("lastmod")
+    if lastmod:
+        parts += ["<lastmod>", lastmod.strftime("%Y-%m-%d"), "</lastmod>"]
+    if url_info.get("changefreq"):
+        parts += ["<changefreq>", url_info["changefreq"], "</changefreq>"]
+    if url_info.get("priority"):
+        parts += ["<priority>", "%s" % url_info["priority"], "</priority>"]
+    parts.append("</url>\n")
+    return "".join(parts)
+
+
+def _stream_sitemap(maps, page, site, protocol):
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    for sitemap in maps:
+        if hasattr(sitemap, "iter_urls"):
+            urls = sitemap.iter_urls(page=page, site=site, protocol=protocol)
+        else:
+            urls = sitemap.get_urls(page=page, site=site, protocol=protocol)
+        for url_info in urls:
+            yield _url_xml(url_info)
+    yield "</urlset>\n"
+
+
+def sitemap(request, sitemaps, section=None, content_type="application/xml"):
+    """
+    A streaming replacement for django.contrib.sitemaps.views.sitemap
+    """
+    if section is not None:
+        if section not in sitemaps:
+            raise Http404("No sitemap available for section: %r" % section)
+        maps = [sitemaps[section]]
+    else:
+        maps = list(sitemaps.values())
+    maps = [m() if callable(m) else m for m in maps]
+
+    try:
+        page = int(request.GET.get("p", 1))
+    except ValueError:
+        raise Http404("No page %r" % request.GET.get("p"))
+    if page < 1 or (page > 1 and all(page > m.paginator.num_pages for m in maps)):
+        raise Http404("Page %s empty" % page)
+
+    etag = last_modified = None
+    if conf.get("conditional_get") and all(
+        hasattr(m, "get_validator_data") for m in maps
+    ):
+        data = [m.get_validator_data() for m in maps]
+        latest = [d[0] for d in data if d[0] is not None]
+        if latest:
+            last_modified = calendar.timegm(max(latest).utctimetuple())
+        key = "{}://{}:{}:{}:{}".format(
+            request.scheme, request.get_host(), section, page, data
+        )
+        etag = '"{}"'.format(hashlib.md5(key.encode("utf-8")).hexdigest())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is not None:
+            return response
+
+    response = StreamingHttpResponse(
+        _stream_sitemap(maps, page, get_current_site(request), request.scheme),
+        content_type=content_type,
+    )
+    if etag is not None:
+        response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    return response
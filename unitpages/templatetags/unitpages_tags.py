@@ -17,6 +17,7 @@ unitpage_url - provide an href to a unitpage by slug.
 from __future__ import print_function, unicode_literals
 
 #######################
+import hashlib
 import os
 import re
 
@@ -27,7 +28,10 @@ from django.utils.encoding import force_text, smart_str
 from django.utils.safestring import mark_safe
 from django.utils.timezone import now
 
+from .. import conf, dependencies, instrumentation, rendering
+from ..cache import template_cache
 from ..models import Page, SiteFile
+from ..tree import page_tree
 
 #####################################################################
 
@@ -140,13 +144,121 @@ def do_current_time(parser, token):
 #####################################################################
 
 
+def normalize_page_url(url):
+    """
+    Page urls in tags may omit their leading and trailing slashes.
+    """
+    if not url.startswith("/"):
+        url = "/" + url
+    if not url.endswith("/"):
+        url = url + "/"
+    return url
+
+
+def url_suffix_filter(suffix):
+    """
+    Filter arguments for pages whose url ends with suffix; the same
+    matches as ``url__endswith`` (including its case insensitivity on
+    SQLite), but indexable (see migration 0017).
+    """
+    return {"url_reversed__startswith": suffix[::-1]}
+
+
+class Model_Href_Batch(object):
+    """
+    All of the ``unitpage_url``/``sitefile_url`` tags in one template.
+
+    Literal arguments are collected at parse time.  The first tag
+    rendered resolves all of them at once, with one query per model;
+    results are memoized on the render context so repeated tags (and
+    repeated variables) do not query again.
+    """
+
+    def __init__(self):
+        self.literals = {Page: set(), SiteFile: set()}
+
+    def add(self, model, slug, literal):
+        if literal:
+            if model == Page:
+                slug = normalize_page_url(slug)
+            self.literals[model].add(slug)
+
+    def get_memo(self, context):
+        if self not in context.render_context:
+            with instrumentation.stage("tags"):
+                context.render_context[self] = self.load()
+        return context.render_context[self]
+
+    def load(self):
+        """
+        Resolve every literal argument; return the memo dictionary.
+        """
+        memo = {}
+        urls = self.literals[Page]
+        if urls:
+            seen = set()
+            for o in Page.objects.filter(active=True, url__in=urls).only("url"):
+                key = (Page, o.url)
+                if key in seen:
+                    # duplicate urls: let the single lookup raise, as before.
+                    memo.pop(key, None)
+                    continue
+                seen.add(key)
+                memo[key] = o.get_absolute_url()
+            # misses are left to the single lookup (suffix fallback).
+        slugs = self.literals[SiteFile]
+        if slugs:
+            found = SiteFile.objects.filter(active=True, slug__in=slugs).only(
+                "slug", "file"
+            )
+            for o in found:
+                memo[(SiteFile, o.slug)] = o.get_absolute_url()
+            for slug in slugs:
+                memo.setdefault((SiteFile, slug), "")
+        return memo
+
+    def resolve(self, context, model, slug):
+        if model == Page:
+            slug = normalize_page_url(slug)
+            dependencies.record(dependencies.PAGE, slug)
+        else:
+            dependencies.record(dependencies.SITEFILE, slug)
+        memo = self.get_memo(context)
+        key = (model, slug)
+        if key not in memo:
+            with instrumentation.stage("tags"):
+                memo[key] = self.lookup(model, slug)
+        return memo[key]
+
+    def lookup(self, model, slug):
+        """
+        Resolve a single argument.
+        """
+        try:
+            if model == Page:
+                try:
+                    o = model.objects.get(active=True, url=slug)
+                except Page.DoesNotExist:
+                    # same as url__endswith=slug, but can use an index.
+                    o = model.objects.get(active=True, **url_suffix_filter(slug))
+            else:
+                o = model.objects.get(active=True, slug=slug)
+            return o.get_absolute_url()
+        except model.DoesNotExist:
+            return ""
+
+
 class Model_Href_Node(template.Node):
-    def __init__(self, tag_name, model, slug, literal, context_name):
+    def __init__(self, tag_name, model, slug, literal, context_name, batch=None):
         self.tag_name = tag_name
         self.model = model
         self.slug = slug
         self.literal = literal
         self.context_name = context_name
+        if batch is None:
+            batch = Model_Href_Batch()
+        batch.add(model, slug, literal)
+        self.batch = batch
 
     def render(self, context):
         if self.literal:
@@ -159,22 +271,7 @@ class Model_Href_Node(template.Node):
                 )
             slug = context[self.slug]
 
-        try:
-            if self.model == Page:
-                url = slug
-                if not url.startswith("/"):
-                    url = "/" + url
-                if not url.endswith("/"):
-                    url = url + "/"
-                try:
-                    o = self.model.objects.get(active=True, url=url)
-                except Page.DoesNotExist:
-                    o = self.model.objects.get(active=True, url__endswith=url)
-            else:
-                o = self.model.objects.get(active=True, slug=slug)
-            url = o.get_absolute_url()
-        except self.model.DoesNotExist:
-            url = ""
+        url = self.batch.resolve(context, self.model, slug)
 
         if self.context_name is not None:
             context[self.context_name] = url
@@ -211,14 +308,19 @@ def do_model_href(model, parser, token):
     else:
         literal = False
 
+    # one batch per template being parsed
+    batch = getattr(parser, "_model_href_batch", None)
+    if batch is None:
+        batch = parser._model_href_batch = Model_Href_Batch()
+
     if len(token_contents) == 2:
-        return Model_Href_Node(tag_name, model, slug, literal, None)
+        return Model_Href_Node(tag_name, model, slug, literal, None, batch)
 
     if len(token_contents) == 4:
         if token_contents[2] != "as":
             raise template.TemplateSyntaxError("invalid syntax for %r tag" % tag_name)
         context_name = token_contents[3]
-        return Model_Href_Node(tag_name, model, slug, literal, context_name)
+        return Model_Href_Node(tag_name, model, slug, literal, context_name, batch)
 
     raise template.TemplateSyntaxError("%r tag: invalid syntax" % tag_name)
 
@@ -254,14 +356,28 @@ def do_sitefile_href(parser, token):
 #####################################################################
 
 
+def get_page_entry(url):
+    """
+    Return the active page (or its page tree entry) with the given url,
+    or None.  Entries have url, title and short_title attributes, and
+    the get_absolute_url() and get_short_title_display() methods.
+    """
+    dependencies.record(dependencies.PAGE, url)
+    with instrumentation.stage("tags"):
+        if conf.get("page_tree"):
+            return page_tree.get(url)
+        try:
+            return Page.objects.get(active=True, url=url)
+        except Page.DoesNotExist:
+            return None
+
+
 @register.inclusion_tag("unitpages/includes/breadcrumb.html")
 def unitpage_breadcrumb(url):
-    try:
-        o = Page.objects.get(active=True, url=url)
-    except Page.DoesNotExist:
+    o = get_page_entry(url)
+    if o is None:
         return {}
-    else:
-        return {"url": o.get_absolute_url(), "title": o.title}
+    return {"url": o.get_absolute_url(), "title": o.title}
 
 
 #####################################################################
@@ -272,11 +388,8 @@ def unitpage_title(context, url, titlevar, urlvar=None):
     context[titlevar] = ""
     if urlvar is not None:
         context[urlvar] = ""
-    try:
-        o = Page.objects.get(active=True, url=url)
-    except Page.DoesNotExist:
-        pass
-    else:
+    o = get_page_entry(url)
+    if o is not None:
         context[titlevar] = o.get_short_title_display()
         if urlvar is not None:
             context[urlvar] = o.get_absolute_url()
@@ -289,8 +402,10 @@ def unitpage_title(context, url, titlevar, urlvar=None):
 @register.simple_tag(takes_context=True)
 def unitpage_load_page(context, url, save_as=None):
     result = ""
+    dependencies.record(dependencies.PAGE, url)
     try:
-        o = Page.objects.get(active=True, url=url)
+        with instrumentation.stage("tags"):
+            o = Page.objects.get(active=True, url=url)
     except Page.DoesNotExist:
         pass
     else:
@@ -304,6 +419,24 @@ def unitpage_load_page(context, url, save_as=None):
 #####################################################################
 
 
+TEMPLATE_LIBRARY_NAME = os.path.splitext(os.path.split(__file__)[-1])[0]
+
+
+def get_content_template(text):
+    """
+    Return the compiled Template for the given page text.
+    Templates are kept in a bounded per-process LRU, keyed by a hash
+    of the text, so each distinct content is parsed once.
+    """
+    template_text = "{% load " + TEMPLATE_LIBRARY_NAME + " %}\n" + text
+    key = hashlib.sha1(template_text.encode("utf-8")).hexdigest()
+    t = template_cache.get(key)
+    if t is None:
+        t = Template(template_text)
+        template_cache.set(key, t)
+    return t
+
+
 @register.filter(name="prerender")
 def render_as_template(text, context=None):
     """
@@ -311,10 +444,12 @@ def render_as_template(text, context=None):
     """
     if context is None:
         context = Context({})
-    this_file = os.path.splitext(os.path.split(__file__)[-1])[0]
-    template_text = "{% load " + this_file + " %}\n" + text
-    t = Template(template_text)
-    output = t.render(context)
+    with instrumentation.stage("prerender"):
+        t = get_content_template(text)
+        note_template = getattr(context, "note_template", None)
+        if note_template is not None:
+            note_template(t)
+        output = t.render(context)
     return output
 
 
@@ -324,6 +459,23 @@ render_as_template.is_safe = True
 #####################################################################
 
 
+@register.filter(name="unitpage_restructuredtext", is_safe=True)
+def unitpage_restructuredtext(text, page=None):
+    """
+    {{ page_content|unitpage_restructuredtext }}
+    {{ page_content|unitpage_restructuredtext:page }}
+
+    The ``restructuredtext`` filter (of the ``markup`` library),
+    through the unitpages rendering pipeline.  Given the page, its last
+    stored html is shown if the renderer cannot convert the text.
+    """
+    stored_html = getattr(page, "rendered_content", "")
+    return rendering.restructuredtext(text, stored_html)
+
+
+#####################################################################
+
+
 @register.simple_tag(name="prerender_with_context", takes_context=True)
 def render_as_template_with_context(context, text, save_as=None, **kwargs):
     """
@@ -331,10 +483,9 @@ def render_as_template_with_context(context, text, save_as=None, **kwargs):
     {% prerender_with_context page.content "my_content" %}
     {% prerender_with_context page.content "my_content" foo="bar" ... %}
     """
-    local_context = Context(context)
-    if kwargs:
-        local_context.update(kwargs)
-    render = render_as_template(text, local_context)
+    # pushed, not copied: rendering.prerender_page() watches the lookups.
+    with context.push(**kwargs):
+        render = render_as_template(text, context)
     if save_as is not None:
         context[save_as] = render
         return ""
@@ -0,0 +1,266 @@
+"""
+Tests for the UnitPages caches and stored html.
+
+These need a project with ``unitpages`` installed; run them with
+``./manage.py test unitpages``.
+"""
+#######################################################################
+from __future__ import print_function, unicode_literals
+
+from django.core.cache import caches
+from django.core.management import call_command
+from django.http import Http404, HttpResponse
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from . import dependencies, response_cache
+from .cache import (
+    GENERATION_KEY,
+    _changes_key,
+    check_generation,
+    page_resolution_cache,
+)
+from .models import Page, PageDependency
+from .tree import page_tree
+from .views import get_page
+
+#######################################################################
+
+
+def clear_caches():
+    caches["default"].clear()
+    page_resolution_cache.clear()
+    page_tree.clear()
+    check_generation()
+
+
+def reload(page):
+    return Page.objects.get(pk=page.pk)
+
+
+#######################################################################
+
+
+class DependencyTests(TestCase):
+    """
+    Stored html is marked stale by changes to the pages it refers to,
+    and rendered again by ``unitpages_render``.
+    """
+
+    def setUp(self):
+        clear_caches()
+        self.target = Page.objects.create(url="/a/b/", title="B", content="B page")
+        self.page = Page.objects.create(
+            url="/c/", title="C", content="See {% unitpage_url 'b' %}"
+        )
+
+    def test_references_are_stored(self):
+        self.assertIn("/a/b/", self.page.get_rendered_content())
+        self.assertEqual(
+            set(PageDependency.objects.values_list("page_id", "kind", "target")),
+            {(self.page.pk, dependencies.PAGE, "/b/")},
+        )
+
+    def test_referenced_page_change(self):
+        self.target.url = "/x/b/"
+        self.target.save()
+        page = reload(self.page)
+        self.assertIsNone(page.get_rendered_content())
+        self.assertIsNotNone(page.dependencies_modified)
+
+        call_command("unitpages_render", verbosity=0)
+        html = reload(self.page).get_rendered_content()
+        self.assertIn("/x/b/", html)
+        self.assertNotIn("/a/b/", html)
+
+    def test_referenced_page_delete(self):
+        self.target.delete()
+        self.assertIsNone(reload(self.page).get_rendered_content())
+
+    def test_unrelated_change(self):
+        Page.objects.create(url="/d/", title="D", content="D page")
+        self.target.save(update_fields=["public"])
+        self.assertIsNotNone(reload(self.page).get_rendered_content())
+
+    def test_render_skips_fresh_pages(self):
+        self.target.title = "New B"
+        self.target.save()
+        self.assertEqual(
+            list(Page.objects.filter(rendered_hash="").values_list("pk", flat=True)),
+            [self.page.pk],
+        )
+        call_command("unitpages_render", verbosity=0)
+        self.assertFalse(Page.objects.filter(rendered_hash="").exists())
+
+
+#######################################################################
+
+
+class PageCacheTests(TestCase):
+    """
+    The page resolution cache and the page tree follow saves and
+    deletes.
+    """
+
+    def setUp(self):
+        clear_caches()
+        self.root = Page.objects.create(url="/", title="Home", content="Home")
+        self.page = Page.objects.create(url="/a/", title="A", content="A page")
+
+    def test_get_page_after_save(self):
+        self.assertEqual(get_page("/a/").title, "A")
+        self.page.title = "New A"
+        self.page.save()
+        self.assertEqual(get_page("/a/").title, "New A")
+
+    def test_get_page_after_url_change(self):
+        get_page("/a/")
+        self.page.url = "/b/"
+        self.page.save()
+        self.assertRaises(Http404, get_page, "/a/")
+        self.assertEqual(get_page("/b/").pk, self.page.pk)
+
+    def test_get_page_after_delete(self):
+        get_page("/a/")
+        self.page.delete()
+        self.assertRaises(Http404, get_page, "/a/")
+
+    def test_get_page_after_create(self):
+        self.assertRaises(Http404, get_page, "/new/")
+        Page.objects.create(url="/new/", title="New", content="New page")
+        self.assertEqual(get_page("/new/").title, "New")
+
+    def test_tree_after_save(self):
+        self.assertEqual(page_tree.get("/a/").title, "A")
+        self.page.url = "/b/"
+        self.page.title = "B"
+        self.page.save()
+        self.assertIsNone(page_tree.get("/a/"))
+        self.assertEqual(page_tree.get("/b/").title, "B")
+
+    def test_tree_after_deactivate_and_delete(self):
+        self.assertTrue(page_tree.has_url("/a/"))
+        self.page.active = False
+        self.page.save()
+        self.assertFalse(page_tree.has_url("/a/"))
+        self.page.active = True
+        self.page.save()
+        self.assertTrue(page_tree.has_url("/a/"))
+        self.page.delete()
+        self.assertFalse(page_tree.has_url("/a/"))
+
+    def test_breadcrumbs(self):
+        child = Page.objects.create(url="/a/c/", title="C", content="C page")
+        self.assertEqual(child.breadcrumbs(), [("/a/", "A")])
+        self.page.short_title = "Aa"
+        self.page.save()
+        self.assertEqual(child.breadcrumbs(), [("/a/", "Aa")])
+        self.page.delete()
+        self.assertEqual(child.breadcrumbs(), [])
+
+
+#######################################################################
+
+
+@override_settings(UNITPAGES_CONFIG={"invalidation_cache": "default"})
+class GenerationTests(TransactionTestCase):
+    """
+    Changes are announced to the other processes through the
+    generation counter in the invalidation cache.
+    """
+
+    def setUp(self):
+        clear_caches()
+        self.cache = caches["default"]
+        self.page = Page.objects.create(url="/a/", title="A", content="A page")
+        check_generation()
+
+    def other_process_changed(self, pks):
+        generation = self.cache.incr(GENERATION_KEY)
+        self.cache.set(_changes_key(generation), pks)
+
+    def test_save_bumps_generation(self):
+        generation = self.cache.get(GENERATION_KEY)
+        self.page.title = "New A"
+        self.page.save()
+        self.assertEqual(self.cache.get(GENERATION_KEY), generation + 1)
+        self.assertEqual(self.cache.get(_changes_key(generation + 1)), [self.page.pk])
+
+    def test_own_change_keeps_caches(self):
+        get_page("/a/")
+        self.assertTrue(page_tree.has_url("/a/"))
+        self.page.title = "New A"
+        self.page.save()
+        with self.assertNumQueries(0):
+            check_generation()
+            self.assertEqual(page_tree.get("/a/").title, "New A")
+
+    def test_other_process_change(self):
+        self.assertEqual(get_page("/a/").title, "A")
+        self.assertTrue(page_tree.has_url("/a/"))
+        Page.objects.filter(pk=self.page.pk).update(title="Other A")
+        self.other_process_changed([self.page.pk])
+        self.assertEqual(page_tree.get("/a/").title, "Other A")
+        self.assertEqual(get_page("/a/").title, "Other A")
+
+    def test_other_process_unknown_change(self):
+        self.assertTrue(page_tree.has_url("/a/"))
+        Page.objects.filter(pk=self.page.pk).update(url="/b/")
+        self.other_process_changed(None)
+        self.assertFalse(page_tree.has_url("/a/"))
+        self.assertTrue(page_tree.has_url("/b/"))
+
+
+#######################################################################
+
+
+@override_settings(UNITPAGES_CONFIG={"response_cache": "default"})
+class ResponseCacheTests(TestCase):
+    """
+    Cached responses are purged by their page, ancestor and
+    dependency tags.
+    """
+
+    def setUp(self):
+        clear_caches()
+        self.cache = response_cache.get_cache()
+        self.target = Page.objects.create(url="/b/", title="B", content="B page")
+        self.page = Page.objects.create(
+            url="/a/c/", title="C", content="See {% unitpage_url 'b' %}"
+        )
+
+    def store(self, page):
+        key = "test.{}".format(page.pk)
+        tags = response_cache.page_tags(page)
+        response_cache.store(self.cache, key, HttpResponse("cached"), tags)
+        return key
+
+    def test_tags(self):
+        self.assertEqual(
+            response_cache.page_tags(self.page),
+            ["page:{}".format(self.page.pk), "url:/a/"],
+        )
+
+    def test_page_save_purges(self):
+        key = self.store(self.page)
+        self.assertIsNotNone(response_cache.fetch(self.cache, key))
+        self.page.save()
+        self.assertIsNone(response_cache.fetch(self.cache, key))
+
+    def test_new_ancestor_purges(self):
+        key = self.store(self.page)
+        Page.objects.create(url="/a/", title="A", content="A page")
+        self.assertIsNone(response_cache.fetch(self.cache, key))
+
+    def test_referenced_page_purges(self):
+        key = self.store(self.page)
+        self.target.title = "New B"
+        self.target.save()
+        self.assertIsNone(response_cache.fetch(self.cache, key))
+
+    def test_unrelated_page_keeps(self):
+        key = self.store(self.page)
+        Page.objects.create(url="/d/", title="D", content="D page")
+        self.assertIsNotNone(response_cache.fetch(self.cache, key))
+
+
+#######################################################################
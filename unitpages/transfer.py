@@ -0,0 +1,425 @@
+"""
+Bulk export and import of pages, assets and sitefiles.
+
+The data format is JSON lines; one object per line, with a "model" key
+("page", "sitefile" or "asset").  Pages are identified by url,
+sitefiles by slug, and assets by their page url and file name.
+Pages always come before the assets that refer to them.
+
+An archive is a tar file (optionally compressed) holding the stored
+files, under "files/<name>", followed by the data as "data.jsonl".
+"""
+#######################################################################
+from __future__ import print_function, unicode_literals
+
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from . import conf, dependencies, response_cache, search
+from .cache import clear_page_caches, clear_sitefile_caches
+from .models import Asset, Page, SiteFile
+from .tree import page_tree
+from .validation import UrlValidator, check_url_format
+
+#######################################################################
+
+PAGE_FIELDS = ["url", "title", "short_title", "content", "active", "public"]
+PAGE_FIELDS += ["live_render", "created", "modified"]
+SITEFILE_FIELDS = ["slug", "file", "active", "created", "modified"]
+ASSET_FIELDS = ["file", "description", "active", "created", "modified"]
+
+DATA_NAME = "data.jsonl"
+FILES_PREFIX = "files/"
+
+#######################################################################
+
+
+class TransferError(Exception):
+    """
+    Raised for invalid import data.
+    """
+
+
+#######################################################################
+
+
+def iter_records(batch_size=500):
+    """
+    Generate the export records, fetching batch_size rows at a time.
+    """
+    qs = Page.objects.order_by("pk").values_list(*PAGE_FIELDS)
+    for row in qs.iterator(chunk_size=batch_size):
+        record = {"model": "page"}
+        record.update(zip(PAGE_FIELDS, row))
+        yield record
+
+    qs = SiteFile.objects.order_by("pk").values_list(*SITEFILE_FIELDS)
+    for row in qs.iterator(chunk_size=batch_size):
+        record = {"model": "sitefile"}
+        record.update(zip(SITEFILE_FIELDS, row))
+        yield record
+
+    qs = Asset.objects.order_by("pk").values_list("page__url", *ASSET_FIELDS)
+    for row in qs.iterator(chunk_size=batch_size):
+        record = {"model": "asset", "page": row[0]}
+        record.update(zip(ASSET_FIELDS, row[1:]))
+        yield record
+
+
+def write_jsonl(stream, batch_size=500):
+    """
+    Write the export records to a text stream; returns the count.
+    """
+    count = 0
+    for record in iter_records(batch_size):
+        stream.write(json.dumps(record, cls=DjangoJSONEncoder))
+        stream.write("\n")
+        count += 1
+    return count
+
+
+def stored_files(batch_size=500):
+    """
+    Generate (storage, name) for every stored file.
+    """
+    for model in (SiteFile, Asset):
+        storage = model._meta.get_field("file").storage
+        qs = model.objects.order_by("pk").values_list("file", flat=True)
+        for name in qs.iterator(chunk_size=batch_size):
+            if name:
+                yield storage, name
+
+
+def write_archive(fileobj, mode="w|gz", batch_size=500):
+    """
+    Write a tar archive of the stored files and the export data
+    to a binary stream; returns the count of records.
+    """
+    with tarfile.open(fileobj=fileobj, mode=mode) as archive:
+        for storage, name in stored_files(batch_size):
+            if not storage.exists(name):
+                continue
+            info = tarfile.TarInfo(FILES_PREFIX + name)
+            info.size = storage.size(name)
+            with storage.open(name, "rb") as f:
+                archive.addfile(info, f)
+
+        # spooled, since the member size must be known before writing.
+        with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as data:
+            text = _TextWriter(data)
+            count = write_jsonl(text, batch_size)
+            info = tarfile.TarInfo(DATA_NAME)
+            info.size = data.tell()
+            data.seek(0)
+            archive.addfile(info, data)
+    return count
+
+
+class _TextWriter(object):
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, text):
+        self.stream.write(text.encode("utf-8"))
+
+
+#######################################################################
+
+
+class Importer(object):
+    """
+    Loads JSON lines records in batches.  Pages are created with
+    bulk_create (or, with update=True, existing urls are changed with
+    bulk_update); url uniqueness is checked with one query per batch.
+    """
+
+    def __init__(self, update=False, batch_size=500, file_names=None):
+        self.update = update
+        self.batch_size = batch_size
+        # archive file name -> name in storage
+        self.file_names = file_names or {}
+        self.seen_urls = set()
+        self.url_validator = UrlValidator()
+        self.counts = {"page": 0, "sitefile": 0, "asset": 0}
+        self._batch = []
+        self._batch_model = None
+
+    def add(self, record):
+        model = record.get("model")
+        if model not in self.counts:
+            raise TransferError("Unknown record type: %r" % model)
+        if model != self._batch_model or len(self._batch) >= self.batch_size:
+            self.flush()
+            self._batch_model = model
+        self._batch.append(record)
+
+    def flush(self):
+        if self._batch:
+            getattr(self, "load_%ss" % self._batch_model)(self._batch)
+            self.counts[self._batch_model] += len(self._batch)
+        self._batch = []
+
+    def finish(self):
+        self.flush()
+        clear_page_caches()
+        clear_sitefile_caches()
+        page_tree.clear()
+        return self.counts
+
+    def _file_name(self, name):
+        return self.file_names.get(name, name)
+
+    def check_urls(self, urls):
+        """
+        Check the urls of a batch of pages; returns {url: pk} for
+        those that already exist.
+        """
+        for url in urls:
+            try:
+                check_url_format(url)
+            except ValidationError as e:
+                raise TransferError("%s: %r" % (" ".join(e.messages), url))
+            if url in self.seen_urls:
+                raise TransferError("Duplicate url in import data: %r" % url)
+            self.seen_urls.add(url)
+        return {
+            url: min(pks) for url, pks in self.url_validator.existing(urls).items()
+        }
+
+    def load_pages(self, records):
+        existing = self.check_urls([r["url"] for r in records])
+        if existing and not self.update:
+            raise TransferError(
+                "Pages already exist: %s" % ", ".join(sorted(existing))
+            )
+        new_pages = []
+        changed_pages = []
+        for r in records:
+            page = Page(**{f: r[f] for f in PAGE_FIELDS if f in r})
+            page.url_reversed = page.url[::-1]
+            if page.url in existing:
+                page.pk = existing[page.url]
+                changed_pages.append(page)
+            else:
+                new_pages.append(page)
+        if new_pages:
+            Page.objects.bulk_create(new_pages)
+        if changed_pages:
+            fields = [f for f in PAGE_FIELDS if f not in ("url", "created")]
+            fields += ["url_reversed", "rendered_hash"]
+            now = timezone.now()
+            for page in changed_pages:
+                page.rendered_hash = ""
+                page.modified = now
+            Page.objects.bulk_update(changed_pages, fields)
+        # bulk_create/bulk_update send no signals
+        response_cache.purge_pages(new_pages + changed_pages)
+        targets = set()
+        for r in records:
+            targets |= dependencies.suffix_candidates(r["url"])
+        dependencies.invalidate(dependencies.PAGE, targets)
+        if conf.get("search"):
+            search.index_pages(
+                Page.objects.filter(url__in=[r["url"] for r in records]).only(
+                    *search.INDEX_FIELDS
+                )
+            )
+
+    def load_sitefiles(self, records):
+        slugs = [r["slug"] for r in records]
+        existing = set(
+            SiteFile.objects.filter(slug__in=slugs).values_list("slug", flat=True)
+        )
+        if existing and not self.update:
+            raise TransferError(
+                "Sitefiles already exist: %s" % ", ".join(sorted(existing))
+            )
+        new_files = []
+        changed_files = []
+        for r in records:
+            sitefile = SiteFile(**{f: r[f] for f in SITEFILE_FIELDS if f in r})
+            sitefile.file = self._file_name(r["file"])
+            if sitefile.slug in existing:
+                changed_files.append(sitefile)
+            else:
+                new_files.append(sitefile)
+        if new_files:
+            SiteFile.objects.bulk_create(new_files)
+        if changed_files:
+            now = timezone.now()
+            for sitefile in changed_files:
+                sitefile.modified = now
+            SiteFile.objects.bulk_update(changed_files, ["file", "active", "modified"])
+        # a reference to a missing sitefile renders as "", so new ones count too
+        dependencies.invalidate(dependencies.SITEFILE, slugs)
+
+    def load_assets(self, records):
+        page_ids = dict(
+            Page.objects.filter(
+                url__in=set(r["page"] for r in records)
+            ).values_list("url", "pk")
+        )
+        existing = {
+            (page_id, name): pk
+            for pk, page_id, name in Asset.objects.filter(
+                page_id__in=page_ids.values()
+            ).values_list("pk", "page_id", "file")
+        }
+        assets = []
+        changed_assets = []
+        for r in records:
+            if r["page"] not in page_ids:
+                raise TransferError("Asset for unknown page: %r" % r["page"])
+            asset = Asset(**{f: r[f] for f in ASSET_FIELDS if f in r})
+            asset.page_id = page_ids[r["page"]]
+            asset.file = self._file_name(r["file"])
+            if (asset.page_id, asset.file.name) in existing:
+                continue
+            if self.update and (asset.page_id, r["file"]) in existing:
+                # the archived file replaces the stored one (see save_file)
+                asset.pk = existing[(asset.page_id, r["file"])]
+                changed_assets.append(asset)
+            else:
+                assets.append(asset)
+        if assets:
+            Asset.objects.bulk_create(assets)
+        if changed_assets:
+            now = timezone.now()
+            for asset in changed_assets:
+                asset.modified = now
+            Asset.objects.bulk_update(
+                changed_assets, ["file", "description", "active", "modified"]
+            )
+        response_cache.purge_tags(
+            [
+                "page:{}".format(pk)
+                for pk in set(a.page_id for a in assets + changed_assets)
+            ]
+        )
+
+
+#######################################################################
+
+
+def read_jsonl(stream, importer):
+    """
+    Feed JSON lines from a text (or utf-8 binary) stream to the importer.
+    """
+    for lineno, line in enumerate(stream, 1):
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise TransferError("Line %d: %s" % (lineno, e))
+        importer.add(record)
+
+
+def _file_digest(fileobj, chunk_size=64 * 1024):
+    digest = hashlib.sha1()
+    for chunk in iter(lambda: fileobj.read(chunk_size), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _check_file_name(name):
+    """
+    Raise TransferError unless name is a plain, relative storage name.
+    """
+    parts = name.split("/")
+    if (
+        not name
+        or "\\" in name
+        or os.path.isabs(name)
+        or any(part in ("", ".", "..") for part in parts)
+    ):
+        raise TransferError("Invalid file name in archive: %r" % name)
+
+
+def save_file(storage, name, fileobj):
+    """
+    Store an archived file; returns (the name in storage, whether a new
+    file was stored).  A stored file with the same name and contents is
+    kept; when the contents differ, the file is stored under a new name
+    (chosen by the storage), so the imported records refer to the new
+    contents.
+    """
+    from django.core.files import File
+
+    if storage.exists(name):
+        # archive members can only be read once
+        spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        shutil.copyfileobj(fileobj, spooled)
+        size = spooled.tell()
+        spooled.seek(0)
+        if size == storage.size(name):
+            with storage.open(name, "rb") as stored:
+                same = _file_digest(stored) == _file_digest(spooled)
+            if same:
+                return name, False
+            spooled.seek(0)
+        fileobj = spooled
+    return storage.save(name, File(fileobj, name=os.path.basename(name))), True
+
+
+@transaction.atomic
+def import_jsonl(stream, update=False, batch_size=500):
+    importer = Importer(update=update, batch_size=batch_size)
+    read_jsonl(stream, importer)
+    return importer.finish()
+
+
+@transaction.atomic
+def import_archive(fileobj, update=False, batch_size=500):
+    """
+    Import a tar archive, streamed from a binary file object.
+    If the import fails, the files it stored are deleted again.
+    """
+    storage = Asset._meta.get_field("file").storage
+    importer = Importer(update=update, batch_size=batch_size)
+    saved = []
+    try:
+        with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+            for member in archive:
+                if not member.isfile():
+                    continue
+                f = archive.extractfile(member)
+                if member.name.startswith(FILES_PREFIX):
+                    name = member.name[len(FILES_PREFIX) :]
+                    _check_file_name(name)
+                    try:
+                        stored, new = save_file(storage, name, f)
+                    except SuspiciousFileOperation as e:
+                        raise TransferError("%s: %r" % (e, name))
+                    if new:
+                        saved.append(stored)
+                    importer.file_names[name] = stored
+                elif member.name == DATA_NAME:
+                    read_jsonl(f, importer)
+        return importer.finish()
+    except tarfile.TarError as e:
+        _delete_files(storage, saved)
+        raise TransferError("Invalid archive: %s" % e)
+    except Exception:
+        _delete_files(storage, saved)
+        raise
+
+
+def _delete_files(storage, names):
+    for name in names:
+        storage.delete(name)
+
+
+#######################################################################
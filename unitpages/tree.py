@@ -0,0 +1,254 @@
+"""
+An in-memory tree of the active pages.
+
+The tree is a trie keyed on url segments; each node holds the pages
+whose url has exactly those segments (e.g., "/a/b" and "/a/b/").
+It is built with a single query the first time it is needed, and
+updated in place by the Page save/delete signal handlers.
+"""
+#######################################################################
+from __future__ import print_function, unicode_literals
+
+import threading
+import time
+
+from django.urls import get_script_prefix
+from django.utils.encoding import iri_to_uri
+
+from . import conf
+
+#######################################################################
+
+
+def url_parts(url):
+    """
+    Split a page url into its segments, as Page.breadcrumbs() does.
+    """
+    parts = url.split("/")
+    if not parts[-1]:
+        parts = parts[:-1]
+    if parts and not parts[0]:
+        parts = parts[1:]
+    return parts
+
+
+#######################################################################
+
+
+class PageEntry(object):
+    """
+    The bits of a Page the tree keeps around.
+    """
+
+    __slots__ = ("pk", "url", "title", "short_title", "modified")
+
+    def __init__(self, pk, url, title, short_title, modified=None):
+        self.pk = pk
+        self.url = url
+        self.title = title
+        self.short_title = short_title
+        self.modified = modified
+
+    def get_short_title_display(self):
+        if self.short_title:
+            return self.short_title
+        return self.title
+
+    def get_absolute_url(self):
+        return iri_to_uri(get_script_prefix().rstrip("/") + self.url)
+
+
+class _Node(object):
+
+    __slots__ = ("children", "pages")
+
+    def __init__(self):
+        self.children = {}
+        self.pages = {}
+
+
+#######################################################################
+
+
+class PageTree(object):
+    """
+    Trie of active pages.  The timeout may be given as the name of a
+    setting, which is read when used (see conf.setting_value()).
+    """
+
+    def __init__(self, timeout=None):
+        self._timeout = timeout
+        self._lock = threading.RLock()
+        self._root = None
+        self._by_pk = {}
+        self._by_url = {}
+        self._built_at = None
+
+    @property
+    def timeout(self):
+        return conf.setting_value(self._timeout)
+
+    def _is_built(self):
+        if self._root is None:
+            return False
+        timeout = self.timeout
+        if timeout and self._built_at + timeout < time.time():
+            return False
+        return True
+
+    def _ensure(self):
+        from .cache import check_generation
+
+        check_generation()
+        if not self._is_built():
+            self.rebuild()
+        return self._root
+
+    def rebuild(self):
+        """
+        Load every active page.
+        """
+        from .models import Page
+
+        qs = Page.objects.filter(active=True).values_list(
+            "pk", "url", "title", "short_title", "modified"
+        )
+        with self._lock:
+            self._root = _Node()
+            self._by_pk = {}
+            self._by_url = {}
+            for row in qs.iterator():
+                self._add(PageEntry(*row))
+            self._built_at = time.time()
+
+    def clear(self):
+        """
+        Forget everything; the tree is rebuilt when next used.
+        """
+        with self._lock:
+            self._root = None
+            self._by_pk = {}
+            self._by_url = {}
+
+    def _find(self, parts, create=False):
+        node = self._root
+        for part in parts:
+            child = node.children.get(part)
+            if child is None:
+                if not create:
+                    return None
+                child = node.children[part] = _Node()
+            node = child
+        return node
+
+    def _add(self, entry):
+        node = self._find(url_parts(entry.url), create=True)
+        node.pages[entry.url] = entry
+        self._by_pk[entry.pk] = entry
+        self._by_url[entry.url] = entry
+
+    def _remove(self, pk):
+        entry = self._by_pk.pop(pk, None)
+        if entry is None:
+            return
+        node = self._find(url_parts(entry.url))
+        if node is not None and node.pages.get(entry.url) is entry:
+            del node.pages[entry.url]
+        if self._by_url.get(entry.url) is entry:
+            del self._by_url[entry.url]
+
+    def page_saved(self, page):
+        """
+        Update the tree for a saved page.
+        """
+        with self._lock:
+            if self._root is None:
+                return
+            if set(page.get_deferred_fields()) & {
+                "active",
+                "url",
+                "title",
+                "short_title",
+                "modified",
+            }:
+                self.clear()
+                return
+            self._remove(page.pk)
+            if page.active:
+                self._add(
+                    PageEntry(
+                        page.pk, page.url, page.title, page.short_title, page.modified
+                    )
+                )
+
+    def refresh(self, pks):
+        """
+        Reload the entries of the given pages (e.g., changed by another
+        process).
+        """
+        from .models import Page
+
+        with self._lock:
+            if self._root is None or not pks:
+                return
+            qs = Page.objects.filter(active=True, pk__in=pks).values_list(
+                "pk", "url", "title", "short_title", "modified"
+            )
+            rows = list(qs)
+            for pk in pks:
+                self._remove(pk)
+            for row in rows:
+                self._add(PageEntry(*row))
+
+    def page_deleted(self, page):
+        """
+        Update the tree for a deleted page.
+        """
+        with self._lock:
+            if self._root is not None:
+                self._remove(page.pk)
+
+    def get(self, url):
+        """
+        Return the entry for the active page with the given url, or None.
+        """
+        with self._lock:
+            self._ensure()
+            node = self._find(url_parts(url))
+            if node is None:
+                return None
+            return node.pages.get(url)
+
+    def has_url(self, url):
+        """
+        Return True if there is an active page with the given url.
+        """
+        with self._lock:
+            self._ensure()
+            return url in self._by_url
+
+    def ancestors(self, url, append_slash):
+        """
+        Return a list of (url, entry) for the ancestors of the given url,
+        root first; entry is None where there is no active page.
+        """
+        parts = url_parts(url)
+        result = []
+        with self._lock:
+            node = self._ensure()
+            for i in range(1, len(parts)):
+                url_part = "/" + "/".join(parts[:i])
+                if append_slash:
+                    url_part += "/"
+                if node is not None:
+                    node = node.children.get(parts[i - 1])
+                entry = node.pages.get(url_part) if node is not None else None
+                result.append((url_part, entry))
+        return result
+
+
+#######################################################################
+
+page_tree = PageTree(timeout="page_cache_timeout")
+
+#######################################################################
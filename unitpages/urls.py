@@ -14,13 +14,16 @@ E.g.,
 
 from django.conf.urls import url
 
-from .views import SiteFileDetailView, page_update, unitpage
+from .router import page_url
+from .views import SiteFileDetailView, page_search, page_update, unitpage
 
 urlpatterns = [
     # root index page
     url(r"^$", unitpage, kwargs={"url": "/"}, name="unitpages-root"),
     # page editor
     url(r"^_update(?P<url>.*)$", page_update, name="unitpages-update"),
+    # built-in page search
+    url(r"^_search/$", page_search, name="unitpages-search"),
     # sitefile redirects
     url(
         r"^_files/(?P<slug>[\w-]+)/$",
@@ -33,5 +36,6 @@ urlpatterns = [
         name="unitpages-sitefile-noslash",
     ),
     # catch everything else... but only if it ends with /
-    url(r"^(?P<url>.*/)$", unitpage, name="unitpages-link"),
+    # (and, with the 'page_router' setting, is an active page url)
+    page_url(r"^(?P<url>.*/)$", unitpage, name="unitpages-link"),
 ]
@@ -0,0 +1,95 @@
+"""
+Page url validation, shared by the page forms and bulk imports.
+"""
+#######################################################################
+from __future__ import print_function, unicode_literals
+
+from django import forms
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.translation import ugettext
+
+#######################################################################
+
+COMMON_MIDDLEWARE = "django.middleware.common.CommonMiddleware"
+
+_requires_trailing_slash = None
+
+
+def requires_trailing_slash():
+    """
+    True when page urls must end with a slash, i.e., when APPEND_SLASH
+    is on and the CommonMiddleware is installed.
+    (Computed once; reset when those settings change.)
+    """
+    global _requires_trailing_slash
+    if _requires_trailing_slash is None:
+        middleware = getattr(settings, "MIDDLEWARE", None) or getattr(
+            settings, "MIDDLEWARE_CLASSES", ()
+        )
+        _requires_trailing_slash = bool(
+            settings.APPEND_SLASH and COMMON_MIDDLEWARE in middleware
+        )
+    return _requires_trailing_slash
+
+
+@receiver(setting_changed)
+def _reset(setting, **kwargs):
+    global _requires_trailing_slash
+    if setting in ("APPEND_SLASH", "MIDDLEWARE", "MIDDLEWARE_CLASSES"):
+        _requires_trailing_slash = None
+
+
+def check_url_format(url):
+    """
+    Raise a ValidationError if the url is missing its leading slash,
+    or a required trailing slash.
+    """
+    if not url.startswith("/"):
+        raise forms.ValidationError(
+            ugettext("URL is missing a leading slash."), code="missing_leading_slash"
+        )
+    if requires_trailing_slash() and not url.endswith("/"):
+        raise forms.ValidationError(
+            ugettext("URL is missing a trailing slash."),
+            code="missing_trailing_slash",
+        )
+
+
+#######################################################################
+
+
+class UrlValidator(object):
+    """
+    Checks page urls for uniqueness.  Urls can be primed a batch at a
+    time, with a single query; later checks of those urls are free.
+    """
+
+    def __init__(self):
+        self._pks = {}  # url -> set of page pks with that url
+
+    def prime(self, urls):
+        from .models import Page
+
+        missing = set(url for url in urls if url not in self._pks)
+        if not missing:
+            return
+        for url in missing:
+            self._pks[url] = set()
+        for url, pk in Page.objects.filter(url__in=missing).values_list("url", "pk"):
+            self._pks[url].add(pk)
+
+    def existing(self, urls):
+        """
+        Return {url: set of pks} for the given urls that already exist.
+        """
+        self.prime(urls)
+        return {url: self._pks[url] for url in urls if self._pks[url]}
+
+    def is_duplicate(self, url, exclude_pk=None):
+        self.prime([url])
+        return bool(self._pks[url] - {exclude_pk})
+
+
+#######################################################################
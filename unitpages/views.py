@@ -4,21 +4,46 @@ Views for unitpages
 #######################
 from __future__ import print_function, unicode_literals
 
+import calendar
+import copy
+import hashlib
+import mimetypes
+import os
+import re
+
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.http import (
+    FileResponse,
     Http404,
     HttpResponse,
     HttpResponsePermanentRedirect,
     HttpResponseRedirect,
+    StreamingHttpResponse,
 )
+from django.db.models import Max
 from django.shortcuts import get_object_or_404, render
+from django.template import engines, loader
 from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.views.generic.detail import BaseDetailView
 from django.views.generic.edit import UpdateView
 
+from . import conf, instrumentation, response_cache, search
+from .cache import (
+    PAGE_APPEND_SLASH,
+    PAGE_NOT_FOUND,
+    SITEFILE_NOT_FOUND,
+    check_generation,
+    page_resolution_cache,
+    sitefile_url_cache,
+    template_name_cache,
+)
+from .files import file_url
 from .forms import PageForm, get_asset_formset_class
-from .models import Page, SiteFile
+from .models import Asset, Page, SiteFile
+from .rendering import content_previews
 
 #######################
 #######################################################################
@@ -33,12 +58,18 @@ def get_page(url, queryset=None):
     This does some fancy handling for ``APPEND_SLASH = True``;
     so the object returned *may* also be None, which indicates
     that a page with a trailing slash was found.
+
+    When no queryset is given, resolutions (including misses) are
+    remembered in the per-process page resolution cache.
     """
+    if not url.startswith("/"):
+        url = "/" + url
+
     if queryset is None:
+        if conf.get("page_cache"):
+            return _get_cached_page(url)
         queryset = Page.objects.filter(active=True)
 
-    if not url.startswith("/"):
-        url = "/" + url
     try:
         page = get_object_or_404(queryset, url=url)
     except Http404:
@@ -51,20 +82,141 @@ def get_page(url, queryset=None):
     return page
 
 
+def _get_cached_page(url):
+    """
+    get_page() for active pages, through the resolution cache.
+    The url must already have its leading slash.
+    """
+    check_generation()
+    key = (url, settings.APPEND_SLASH)
+    result = page_resolution_cache.get(key)
+    if result is None:
+        try:
+            result = get_page(url, Page.objects.filter(active=True))
+        except Http404:
+            result = PAGE_NOT_FOUND
+        else:
+            if result is None:
+                result = PAGE_APPEND_SLASH
+        page_resolution_cache.set(key, result)
+
+    if result is PAGE_NOT_FOUND:
+        raise Http404("No Page matches the given query.")
+    if result is PAGE_APPEND_SLASH:
+        return None
+    # callers get their own instance; the cached one is shared.
+    return copy.copy(result)
+
+
 #######################################################################
 
 
+def is_anonymous_request(request):
+    """
+    True for requests whose response does not depend on the user.
+    """
+    user = getattr(request, "user", None)
+    return user is None or not user.is_authenticated
+
+
+def has_static_content(page):
+    """
+    True if the page content is the same for every view, i.e., it is
+    not rendered live for each request (see rendering.prerender_page).
+    """
+    if page.live_render:
+        return False
+    return not page.content or page.get_rendered_content() is not None
+
+
+def page_validators(page):
+    """
+    Return (etag, last_modified) for the given page, where
+    last_modified is a timestamp covering the page, its assets, the
+    ancestor pages in its breadcrumbs, and the pages and sitefiles its
+    content references.
+    """
+    assets_modified = Asset.objects.filter(page_id=page.pk).aggregate(
+        Max("modified")
+    )["modified__max"]
+    ancestors = [(e.pk, e.modified) for e in page.ancestor_entries()]
+    stamps = [page.modified, assets_modified, page.dependencies_modified]
+    stamps += [modified for pk, modified in ancestors]
+    last_modified = max(stamp for stamp in stamps if stamp is not None)
+    timestamp = calendar.timegm(last_modified.utctimetuple())
+    key = "{}:{}:{}:{}:{}".format(
+        page.pk, page.modified, assets_modified, page.dependencies_modified, ancestors
+    )
+    etag = 'W/"{}"'.format(hashlib.md5(key.encode("utf-8")).hexdigest())
+    return etag, timestamp
+
+
+def set_validators(response, etag, last_modified):
+    """
+    Add ETag and Last-Modified headers to a response.
+    """
+    if not response.has_header("ETag"):
+        response["ETag"] = etag
+    if not response.has_header("Last-Modified"):
+        response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+def _template_dirs_fingerprint(templates):
+    """
+    The modification times of the directories the candidate templates
+    would be found in; these change when a candidate is added or removed.
+    """
+    subdirs = sorted({os.path.dirname(name) for name in templates})
+    stamps = []
+    for engine in engines.all():
+        for base in engine.template_dirs:
+            for subdir in subdirs:
+                try:
+                    stamps.append(os.stat(os.path.join(base, subdir)).st_mtime)
+                except OSError:
+                    stamps.append(None)
+    return tuple(stamps)
+
+
+def select_template_name(templates):
+    """
+    Return the name of the first of the candidate templates that
+    exists, through the template name cache.
+    """
+    if not conf.get("template_name_cache"):
+        return loader.select_template(templates).origin.template_name
+    key = tuple(templates)
+    fingerprint = _template_dirs_fingerprint(templates) if settings.DEBUG else None
+    cached = template_name_cache.get(key)
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+    name = loader.select_template(templates).origin.template_name
+    template_name_cache.set(key, (fingerprint, name))
+    return name
+
+
+@instrumentation.instrumented
 def unitpage(request, url, extra_data=None, template_name=None):
     """
     Find the page, serve it.
     """
-    page = get_page(url)
+    with instrumentation.stage("lookup"):
+        page = get_page(url)
     if page is None:
         return HttpResponsePermanentRedirect("%s/" % request.path)
 
-    context = {"page": page}
-    if extra_data is not None:
-        context.update(extra_data)
+    anonymous = request.method in ("GET", "HEAD") and is_anonymous_request(request)
+
+    validators = None
+    if anonymous and conf.get("conditional_get") and has_static_content(page):
+        with instrumentation.stage("validators"):
+            validators = page_validators(page)
+        response = get_conditional_response(
+            request, etag=validators[0], last_modified=validators[1]
+        )
+        if response is not None:
+            return set_validators(response, *validators)
 
     templates = [
         url.strip("/") + ".html",
@@ -74,12 +226,141 @@ def unitpage(request, url, extra_data=None, template_name=None):
     ]
     if template_name is not None:
         templates.insert(0, template_name)
-    return render(request, templates, context)
+
+    cache = cache_key = None
+    if anonymous and has_static_content(page):
+        cache = response_cache.get_cache()
+    if cache is not None:
+        cache_key = response_cache.get_cache_key(request, templates)
+    if cache_key is not None:
+        response = response_cache.fetch(cache, cache_key)
+        if response is not None:
+            return response
+
+    context = {"page": page}
+    if extra_data is not None:
+        context.update(extra_data)
+
+    with instrumentation.stage("render"):
+        response = render(request, select_template_name(templates), context)
+    if validators is not None:
+        set_validators(response, *validators)
+    if cache_key is not None and response_cache.is_cacheable_response(
+        request, response
+    ):
+        response_cache.store(
+            cache, cache_key, response, response_cache.page_tags(page)
+        )
+    return response
+
+
+def page_search(request, template_name="unitpages/search.html"):
+    """
+    Search the public pages with the built-in search index.
+    """
+    query = request.GET.get("q", "").strip()
+    results = []
+    if query:
+        with instrumentation.stage("search"):
+            results = search.search_pages(query, limit=conf.get("search_limit"))
+        # results without fresh stored html are rendered in one batch
+        for page, preview in zip(results, content_previews(results)):
+            page.preview = preview
+    return render(request, template_name, {"query": query, "results": results})
 
 
 #######################################################################
 
 
+def get_sitefile_url(slug):
+    """
+    Return the url of the active sitefile with the given slug,
+    through the sitefile url cache.
+    """
+    check_generation()
+    url = sitefile_url_cache.get(slug)
+    if url is None:
+        sitefile = (
+            SiteFile.objects.filter(active=True, slug=slug).only("slug", "file").first()
+        )
+        url = SITEFILE_NOT_FOUND if sitefile is None else file_url(sitefile.file)
+        sitefile_url_cache.set(slug, url)
+    if url is SITEFILE_NOT_FOUND:
+        raise Http404("No SiteFile matches the given query.")
+    return url
+
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+RANGE_BLOCK_SIZE = 64 * 1024
+
+
+def _stream_range(f, start, length):
+    try:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(RANGE_BLOCK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        f.close()
+
+
+def serve_file(request, field_file, modified):
+    """
+    Serve a stored file inline, with validators and support for
+    single byte range requests.
+    """
+    timestamp = calendar.timegm(modified.utctimetuple())
+    key = "{}:{}".format(field_file.name, modified)
+    etag = '"{}"'.format(hashlib.md5(key.encode("utf-8")).hexdigest())
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is not None:
+        return set_validators(response, etag, timestamp)
+
+    size = field_file.size
+    content_type = mimetypes.guess_type(field_file.name)[0]
+    if content_type is None:
+        content_type = "application/octet-stream"
+
+    range_match = None
+    range_header = request.META.get("HTTP_RANGE", "").strip()
+    if_range = request.META.get("HTTP_IF_RANGE", "").strip()
+    if range_header and (not if_range or if_range == etag):
+        range_match = RANGE_RE.match(range_header)
+
+    if range_match is None:
+        response = FileResponse(field_file.open("rb"), content_type=content_type)
+        response["Content-Length"] = size
+    else:
+        first, last = range_match.groups()
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        elif last:
+            start = max(size - int(last), 0)
+            end = size - 1
+        else:
+            start = size
+            end = 0
+        if start >= size or start > end:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = "bytes */{}".format(size)
+            return response
+        length = end - start + 1
+        response = StreamingHttpResponse(
+            _stream_range(field_file.open("rb"), start, length),
+            status=206,
+            content_type=content_type,
+        )
+        response["Content-Length"] = length
+        response["Content-Range"] = "bytes {}-{}/{}".format(start, end, size)
+
+    response["Accept-Ranges"] = "bytes"
+    return set_validators(response, etag, timestamp)
+
+
 class SiteFileDetailView(BaseDetailView):
     """
     Provide a unified way of retrieving sitefiles.
@@ -88,8 +369,14 @@ class SiteFileDetailView(BaseDetailView):
     queryset = SiteFile.objects.filter(active=True)
 
     def get(self, request, *args, **kwargs):
+        if conf.get("sitefile_serve"):
+            self.object = self.get_object()
+            return serve_file(request, self.object.file, self.object.modified)
+        if conf.get("sitefile_url_cache"):
+            url = get_sitefile_url(self.kwargs[self.slug_url_kwarg])
+            return HttpResponseRedirect(url)
         self.object = self.get_object()
-        return HttpResponseRedirect(self.object.file.url)
+        return HttpResponseRedirect(file_url(self.object.file))
 
 
 #######################################################################